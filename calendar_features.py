@@ -0,0 +1,226 @@
+# calendar_features.py
+# 日本の祝日・長期休み・繁忙期などカレンダー由来の特徴量をまとめて作る
+# アプリの予測用特徴量（1日1行）は build_feature_matrix でまとめてベクトル計算する
+#
+# カレンダー列は calendar_table.npz（CALENDAR_START_YEAR〜CALENDAR_END_YEAR の日付表）を
+# 日付オフセットで引くだけにしてある。表の作り直しは
+#   python calendar_features.py
+# 表の範囲外の日付はその場で計算する
+
+import os
+import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import jpholiday
+
+
+# 予測用特徴量の列順（モデル側は feature_cols で列名選択するので順序は固定しておくだけ）
+FEATURE_COLUMNS = [
+    "曜日", "祝日", "最高気温", "最低気温", "天気",
+    "休日フラグ", "特異日フラグ", "月", "季節", "イベント有無",
+    "長期休みの種類", "長期休みフラグ", "繁忙期フラグ",
+    "前週同曜日_売上", "売上_移動平均7日", "売上",
+]
+
+CALENDAR_TABLE_PATH = "calendar_table.npz"
+CALENDAR_START_YEAR = 2020
+CALENDAR_END_YEAR = 2035
+
+# カレンダー表に持つ列（すべて int8）
+CALENDAR_COLUMNS = [
+    "曜日", "祝日", "休日フラグ", "特異日フラグ", "月", "季節", "長期休みフラグ", "繁忙期フラグ",
+]
+
+WEATHER_CODE = {"Clear": 0, "Clouds": 1, "Rain": 2, "晴れ": 0, "曇り": 1, "雨": 2}
+
+# 月 → 季節（0:春 1:夏 2:秋 3:冬）。添字0は未使用
+SEASON_BY_MONTH = np.array([3, 3, 3, 0, 0, 0, 1, 1, 1, 2, 2, 2, 3], dtype=np.int8)
+
+
+# ========= 日本の長期休み・繁忙期ユーティリティ =========
+def get_all_long_holidays(year):
+    obon_days = [datetime.date(year, 8, d) for d in range(13, 17)]
+    all_days = [datetime.date(year, 1, 1) + datetime.timedelta(days=i) for i in range(370)]
+
+    def is_holiday_like(d):
+        return jpholiday.is_holiday(d) or d.weekday() >= 5 or d in obon_days
+
+    long_holidays = set()
+    current_block = []
+    for d in all_days:
+        if is_holiday_like(d):
+            current_block.append(d)
+        else:
+            if len(current_block) >= 3:
+                long_holidays.update(current_block)
+            current_block = []
+    if len(current_block) >= 3:
+        long_holidays.update(current_block)
+
+    # 学校の長期休み
+    summer = [datetime.date(year, 7, d) for d in range(20, 32)] + [datetime.date(year, 8, d) for d in range(1, 32)]
+    winter = [datetime.date(year, 12, d) for d in range(25, 32)] + [datetime.date(year + 1, 1, d) for d in range(1, 8)]
+    spring = [datetime.date(year, 3, d) for d in range(20, 32)] + [datetime.date(year, 4, d) for d in range(1, 6)]
+    long_holidays.update(summer + winter + spring)
+    return long_holidays
+
+@lru_cache(maxsize=8)
+def _long_holiday_days_for_year(year: int):
+    return get_all_long_holidays(year)
+
+def is_long_holiday(date):
+    # 年越し対応（選択日付の年で判定）
+    return date in _long_holiday_days_for_year(date.year)
+
+def is_crowded_day(date):
+    y = date.year
+    return (
+        datetime.date(y, 7, 20) <= date <= datetime.date(y, 8, 31) or
+        datetime.date(y, 12, 25) <= date <= datetime.date(y + 1, 1, 7) or
+        datetime.date(y, 3, 20) <= date <= datetime.date(y, 4, 5) or
+        datetime.date(y, 8, 13) <= date <= datetime.date(y, 8, 16) or
+        datetime.date(y, 4, 29) <= date <= datetime.date(y, 5, 6)
+    )
+
+
+# ========= ベクトル版 =========
+@lru_cache(maxsize=32)
+def _jp_holidays_array(year: int):
+    return np.array(sorted(d for d, _ in jpholiday.year_holidays(year)), dtype="datetime64[D]")
+
+@lru_cache(maxsize=32)
+def _long_holidays_array(year: int):
+    return np.array(sorted(_long_holiday_days_for_year(year)), dtype="datetime64[D]")
+
+def _as_day_array(dates):
+    """date のリスト等を datetime64[D] の配列にする"""
+    return np.asarray(pd.to_datetime(pd.Series(list(dates))).to_numpy(), dtype="datetime64[D]")
+
+def _compute_calendar_columns(d) -> dict:
+    """datetime64[D] 配列からカレンダー列を計算する（値は is_long_holiday 等と同じ）"""
+    days = d.astype(np.int64)
+    weekday = ((days + 3) % 7).astype(np.int8)   # 1970-01-01 は木曜
+    years = d.astype("datetime64[Y]").astype(np.int64) + 1970
+    month = (d.astype("datetime64[M]").astype(np.int64) % 12 + 1).astype(np.int8)
+    day = (d - d.astype("datetime64[M]")).astype(np.int64) + 1
+    md = month.astype(np.int64) * 100 + day
+
+    holiday = np.zeros(len(d), dtype=bool)
+    long_holiday = np.zeros(len(d), dtype=bool)
+    for y in np.unique(years):
+        in_year = years == y
+        holiday |= in_year & np.isin(d, _jp_holidays_array(int(y)))
+        # 長期休みは「その日付の年」の集合だけで判定する（is_long_holiday と同じ）
+        long_holiday |= in_year & np.isin(d, _long_holidays_array(int(y)))
+
+    crowded = (
+        ((md >= 720) & (md <= 831)) | (md >= 1225) | ((md >= 320) & (md <= 405)) |
+        ((md >= 813) & (md <= 816)) | ((md >= 429) & (md <= 506))
+    )
+    return {
+        "曜日": weekday,
+        "祝日": holiday.astype(np.int8),
+        "休日フラグ": ((weekday >= 5) | holiday).astype(np.int8),
+        "特異日フラグ": ((md == 214) | (md == 1225)).astype(np.int8),
+        "月": month,
+        "季節": SEASON_BY_MONTH[month],
+        "長期休みフラグ": long_holiday.astype(np.int8),
+        "繁忙期フラグ": crowded.astype(np.int8),
+    }
+
+def build_calendar_table(start_year: int = CALENDAR_START_YEAR, end_year: int = CALENDAR_END_YEAR) -> dict:
+    """start_year/1/1〜end_year/12/31 の全日付のカレンダー列を作る"""
+    d = np.arange(np.datetime64(f"{start_year}-01-01"), np.datetime64(f"{end_year + 1}-01-01"),
+                  dtype="datetime64[D]")
+    table = _compute_calendar_columns(d)
+    table["start"] = np.array(d[0])
+    return table
+
+def save_calendar_table(path: str = CALENDAR_TABLE_PATH, **kwargs):
+    table = build_calendar_table(**kwargs)
+    np.savez_compressed(path, **{k: v for k, v in table.items()})
+    return table
+
+@lru_cache(maxsize=1)
+def load_calendar_table(path: str = CALENDAR_TABLE_PATH) -> dict:
+    """カレンダー表を読む（ファイルが無ければメモリ上で作る）"""
+    if os.path.exists(path):
+        with np.load(path) as z:
+            table = {k: z[k] for k in z.files}
+        table["start"] = table["start"].astype("datetime64[D]")
+        if all(c in table for c in CALENDAR_COLUMNS):
+            return table
+    return build_calendar_table()
+
+def calendar_columns(dates) -> dict:
+    """
+    カレンダー由来の列を日付配列からまとめて返す
+    表の範囲内は日付オフセットで O(1) 参照、範囲外だけその場で計算
+    返り値：列名 → int8 配列
+    """
+    d = _as_day_array(dates)
+    table = load_calendar_table()
+    idx = (d - table["start"]).astype(np.int64)
+    inside = (idx >= 0) & (idx < len(table["曜日"]))
+    if inside.all():
+        return {c: table[c][idx] for c in CALENDAR_COLUMNS}
+
+    out = {c: np.zeros(len(d), dtype=np.int8) for c in CALENDAR_COLUMNS}
+    if inside.any():
+        for c in CALENDAR_COLUMNS:
+            out[c][inside] = table[c][idx[inside]]
+    outside = _compute_calendar_columns(d[~inside])
+    for c in CALENDAR_COLUMNS:
+        out[c][~inside] = outside[c]
+    return out
+
+def add_calendar_columns(df: pd.DataFrame, date_col: str = "日付") -> pd.DataFrame:
+    """df の日付列からカレンダー列を引いて上書きする（学習データとアプリで同じ定義に揃える）"""
+    dates = pd.to_datetime(df[date_col], errors="coerce")
+    ok = dates.notna().to_numpy()
+    cal = calendar_columns(dates[ok])
+    for c in CALENDAR_COLUMNS:
+        col = np.zeros(len(df), dtype=np.int8)
+        col[ok] = cal[c]
+        df[c] = col
+    return df
+
+def _numeric(values, n):
+    """スカラー or 配列を長さ n の数値配列に（数値化できない値は 0）"""
+    if np.isscalar(values) or values is None:
+        values = [values] * n
+    return pd.to_numeric(pd.Series(list(values)), errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+
+def build_feature_matrix(dates, temp_max, temp_min, weather, event,
+                         lag7=200000, ma7=200000, sales=200000) -> np.ndarray:
+    """
+    予測用の特徴量行列（float32, 1日1行, 列順は FEATURE_COLUMNS）をまとめて作る
+    weather は「晴れ/曇り/雨」または OpenWeatherMap の英語表記
+    """
+    cal = calendar_columns(dates)
+    n = len(cal["曜日"])
+    cols = dict(cal)
+    cols["最高気温"] = _numeric(temp_max, n)
+    cols["最低気温"] = _numeric(temp_min, n)
+    cols["天気"] = np.array([WEATHER_CODE.get(w, 0) for w in weather], dtype=np.int8)
+    cols["イベント有無"] = _numeric(event, n)
+    cols["長期休みの種類"] = np.zeros(n, dtype=np.int8)
+    cols["前週同曜日_売上"] = _numeric(lag7, n)
+    cols["売上_移動平均7日"] = _numeric(ma7, n)
+    cols["売上"] = _numeric(sales, n)
+
+    out = np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float32)
+    for j, c in enumerate(FEATURE_COLUMNS):
+        out[:, j] = cols[c]
+    return out
+
+def build_feature_frame(*args, **kwargs) -> pd.DataFrame:
+    """build_feature_matrix の DataFrame 版（モデルに列名で渡す用）"""
+    return pd.DataFrame(build_feature_matrix(*args, **kwargs), columns=FEATURE_COLUMNS)
+
+
+if __name__ == "__main__":
+    t = save_calendar_table()
+    print(f"✅ {CALENDAR_TABLE_PATH} を保存しました（{t['start']} から {len(t['曜日'])} 日分）")
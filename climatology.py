@@ -0,0 +1,110 @@
+# climatology.py
+# 過去の日別天気（weather_history）から「平年値」の表を作り、入力フォームの初期値に使う
+# ・1年を 2/29 を含む 366 枠（月日）に分け、前後 CLIMATOLOGY_WINDOW_DAYS 日の全年分から
+#   最高/最低気温の平均・10/90 パーセンタイルと、最も多い天気を持つ
+# ・表は climatology.npz に保存しておき、アプリは読むだけ（API も CSV の集計も不要）
+# 作り直しは
+#   python climatology.py
+
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from calendar_features import WEATHER_CODE
+
+
+CLIMATOLOGY_PATH = "climatology.npz"
+CLIMATOLOGY_WINDOW_DAYS = 3
+N_SLOTS = 366
+WEATHER_NAMES = ["晴れ", "曇り", "雨"]   # WEATHER_CODE の 0/1/2
+
+# 平年値が無い枠の既定値（従来のフォーム初期値）
+DEFAULT_TEMP = 20.0
+DEFAULT_WEATHER = 0
+
+CLIMATOLOGY_COLUMNS = [
+    "temp_max_mean", "temp_max_p10", "temp_max_p90",
+    "temp_min_mean", "temp_min_p10", "temp_min_p90",
+]
+
+
+def day_slots(dates) -> np.ndarray:
+    """日付 → 0〜365 の枠番号（うるう年の通し日。平年の 3/1 以降は1つずらす）"""
+    s = pd.to_datetime(pd.Series(list(dates)))
+    doy = s.dt.dayofyear.to_numpy(dtype=np.int64)
+    shift = (~s.dt.is_leap_year.to_numpy()) & (s.dt.month.to_numpy() > 2)
+    return doy - 1 + shift
+
+
+def build_climatology(history, window: int = CLIMATOLOGY_WINDOW_DAYS) -> dict:
+    """WeatherHistory から平年値の表（列名 → 長さ 366 の配列）を作る"""
+    have = np.flatnonzero(history.found)
+    dates = history.start + have.astype("timedelta64[D]")
+    slots = day_slots(dates)
+    tmax = history.temp_max[have]
+    tmin = history.temp_min[have]
+    wcode = np.array([WEATHER_CODE.get(w, -1) for w in history.weather[have]], dtype=np.int8)
+
+    table = {c: np.full(N_SLOTS, np.nan, dtype=np.float32) for c in CLIMATOLOGY_COLUMNS}
+    table["weather_mode"] = np.full(N_SLOTS, DEFAULT_WEATHER, dtype=np.int8)
+    table["n_samples"] = np.zeros(N_SLOTS, dtype=np.int32)
+    table["n_years"] = np.array(len(np.unique(dates.astype("datetime64[Y]"))), dtype=np.int32)
+
+    for s in range(N_SLOTS):
+        # 年をまたいで前後 window 日（12/31 の隣は 1/1）
+        dist = np.abs(slots - s)
+        near = np.minimum(dist, N_SLOTS - dist) <= window
+        if not near.any():
+            continue
+        table["n_samples"][s] = int(near.sum())
+        for name, values in (("temp_max", tmax[near]), ("temp_min", tmin[near])):
+            values = values[~np.isnan(values)]
+            if len(values):
+                table[f"{name}_mean"][s] = values.mean()
+                table[f"{name}_p10"][s], table[f"{name}_p90"][s] = np.percentile(values, [10, 90])
+        codes = wcode[near]
+        codes = codes[codes >= 0]
+        if len(codes):
+            table["weather_mode"][s] = np.bincount(codes, minlength=len(WEATHER_NAMES)).argmax()
+    return table
+
+
+def save_climatology(path: str = CLIMATOLOGY_PATH, history=None) -> dict:
+    if history is None:
+        from weather_history import load_weather_history
+        history = load_weather_history()
+    table = build_climatology(history)
+    np.savez_compressed(path, **table)
+    return table
+
+
+@lru_cache(maxsize=1)
+def load_climatology(path: str = CLIMATOLOGY_PATH):
+    """平年値の表（ファイルが無ければ None）"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as z:
+        return {k: z[k] for k in z.files}
+
+
+def climatology_defaults(dates):
+    """
+    日付ごとのフォーム初期値：(天気名のリスト, 最高気温, 最低気温)（気温は整数に丸める）
+    平年値が無い日は 晴れ / 20℃
+    """
+    n = len(dates)
+    table = load_climatology()
+    if table is None:
+        return [WEATHER_NAMES[DEFAULT_WEATHER]] * n, np.full(n, int(DEFAULT_TEMP)), np.full(n, int(DEFAULT_TEMP))
+    s = day_slots(dates)
+    tmax = np.nan_to_num(table["temp_max_mean"][s].astype(np.float64), nan=DEFAULT_TEMP)
+    tmin = np.nan_to_num(table["temp_min_mean"][s].astype(np.float64), nan=DEFAULT_TEMP)
+    weather = [WEATHER_NAMES[c] for c in table["weather_mode"][s]]
+    return weather, np.rint(tmax).astype(int), np.rint(tmin).astype(int)
+
+
+if __name__ == "__main__":
+    t = save_climatology()
+    print(f"✅ {CLIMATOLOGY_PATH} を保存しました（{int(t['n_years'])} 年分・1枠あたり最大 {t['n_samples'].max()} 日）")
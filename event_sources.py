@@ -0,0 +1,520 @@
+# event_sources.py
+# ビッグサイト/ダイバーシティ/お台場 の日本語イベントページを取得・解析する
+# ページは取得ごとに1回だけ解析し、日付ごとのイベント一覧（会場, 開始日, 終了日, 正規化タイトル, リンク）を
+# 日付で引ける EventIndex にまとめる（日付・月の問い合わせは索引を引くだけ）
+
+import os
+import re
+import time
+import datetime
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import requests.adapters
+from bs4 import BeautifulSoup
+
+from http_cache import DiskHTTPCache
+from resilience import endpoint_of, record
+
+
+# 収集対象URL（日本語のみ）
+EVENT_SOURCES_JP = [
+    # 東京ビッグサイト（イベント情報）
+    ("https://www.bigsight.jp/visitor/event/", "東京ビッグサイト"),
+    # ダイバーシティ東京プラザ（イベント・キャンペーン）
+    ("https://mitsui-shopping-park.com/divercity-tokyo/event/", "ダイバーシティ東京プラザ"),
+    # お台場 公式ポータル（イベント一覧・カレンダー）
+    ("https://www.tokyo-odaiba.net/event_index/", "お台場（公式一覧）"),
+    ("https://www.tokyo-odaiba.net/event_calender/", "お台場（公式カレンダー）"),
+    # Zepp DiverCity（ライブスケジュール）
+    ("https://www.zepp.co.jp/hall/divercity/schedule/", "Zepp DiverCity"),
+]
+
+# --------------------------------------------
+# 大規模イベントだけに絞るフィルタ関数
+# --------------------------------------------
+BIG_EVENT_KEYWORDS = [
+    "フェス", "フェスタ", "祭",
+    "博", "博覧会", "展示会", "見本市",
+    "エキスポ", "EXPO",
+    "コミックマーケット", "コミケ",
+    "フェア", "ショー",
+    "花火","花火大会","HANABI",
+    "ライブ", "LIVE", "ツアー", "TOUR", "コンサート",
+]
+
+def _filter_big_events(events):
+    """
+    本当に人が多く来る大規模イベントだけに絞るフィルタ
+    ・UIテキスト/商談系を除外
+    ・お台場たこ焼きミュージアム系など常設寄り企画を除外
+    ・デザインフェスタ／アミューズメントエキスポ等はタイトルを正規化して重複削除
+    ・同じイベント（会場×タイトル）は「期間が一番短いもの」だけ残す
+      → デザフェスみたいに 10/04〜11/15 とか 11/14〜11/30 が混在しても、
+         本番の 11/15〜11/16 だけを採用する狙い
+    ※ 1日分（その日に開催中の候補）ずつ渡す。build_event_index が日付ごとに呼ぶ
+    """
+    # サイトのUIテキスト・検索説明・商談系など、明らかにイベント名じゃないもの
+    noise_keywords = [
+        "アクセス", "フロアマップ", "イベント情報", "ショップ＆レストラン","エリアマップ","その他","遊び・エンタメ","利用施設",
+        "イベント検索", "日付検索", "検索結果",
+        "カレンダー", "カレンダーから探す",
+        "ジャンル", "条件選択",
+        "カテゴリーから探す", "キーワードから探す",
+        "年間の主要イベント",
+        "イベント・キャンペーン",
+        "入場区分",     # 商談系のヘッダごと全部カット
+        "開催期間",     # 「開催期間 2025年…」だけの行をカット
+        "開催時間",     # 時間だけの行
+        "商談日時",     # 商談日時だけの行
+        # ※「エ リ ア マ ッ プ」はタイトルにも含まれるのでここには入れない
+    ]
+
+    # 日常寄りのロングラン企画（売上にあまり効かなそうなもの）
+    # ただしタイトルに「東京ビッグサイト」が含まれる場合は残したいので条件で絞る
+    small_odaiba_keywords = [
+        "お台場たこ焼きミュージアム",
+        "台場一丁目商店街",
+        "デックス東京ビーチ",
+    ]
+
+    # key = (会場, 正規化タイトル) → (期間日数, イベントdict)
+    # で管理して、「同じイベント」は一番短い期間だけ残す
+    best_events = {}
+
+    for ev in events:
+        title = ev.get("イベント（抜粋）", "")
+        venue = ev.get("会場", "")
+        start_s = ev.get("開始日") or ""
+        end_s = ev.get("終了日") or ""
+
+        # 0) タイトルがスカスカなら捨てる
+        if not title or len(title) < 6:
+            continue
+
+        # 1) UIテキスト・説明文っぽいものは即除外
+        if any(k in title for k in noise_keywords):
+            continue
+
+        # 1.5) 「2025-11-14 ～ 2025-11-15 東京ビッグサイト」みたいな
+        #      日付＋会場だけで、イベント名が無さそうな行を除外
+        if re.match(r"\d{4}-\d{2}-\d{2}\s*～\s*\d{4}-\d{2}-\d{2}", title):
+            continue
+
+        # 2) 期間（日数）を計算（失敗したら 9999 日扱い）
+        try:
+            start = datetime.date.fromisoformat(start_s)
+            end = datetime.date.fromisoformat(end_s)
+            days = (end - start).days + 1
+        except Exception:
+            start = end = None
+            days = 9999
+
+        # 3) お台場の常設寄り企画をカット
+        #    ただしタイトルに「東京ビッグサイト」がある場合は残す
+        if any(k in title for k in small_odaiba_keywords) and "東京ビッグサイト" not in title:
+            continue
+
+        # 4) どの程度「大きいイベント」とみなすか
+        keep = False
+
+        # 4-1) 東京ビッグサイト本体 or タイトルにビッグサイトと書いてある → 大規模扱いで残す
+        if venue == "東京ビッグサイト" or "東京ビッグサイト" in title:
+            keep = True
+        else:
+            # 4-2) それ以外の会場（ダイバーシティ・防災公園など）
+            #      10日以上続く長期企画は、常設寄りとして除外
+            if days >= 10:
+                keep = False
+            else:
+                # 「フェス」「エキスポ」など “イベントっぽい” キーワードがあるものだけ残す
+                if any(k in title for k in BIG_EVENT_KEYWORDS):
+                    keep = True
+
+        if not keep:
+            continue
+
+        # 5) タイトル正規化（重複削除用＋表示用の整理）
+        norm_title = title
+
+        # デザフェス
+        if "デザインフェスタ" in norm_title:
+            norm_title = "デザインフェスタ vol.62 ＜東京ビッグサイト＞"
+        # アミューズメントエキスポ
+        elif "アミューズメント エキスポ" in norm_title:
+            norm_title = "アミューズメント エキスポ 2025 ＜東京ビッグサイト＞"
+        # プロジェクションマッピング
+        elif "プロジェクションマッピングアワード" in norm_title:
+            norm_title = "東京国際プロジェクションマッピングアワード Vol.10"
+        # 防災フェスタ
+        elif "防災フェスタ" in norm_title:
+            norm_title = "防災フェスタ2025「備蓄を考える」"
+
+        key = (venue, norm_title)
+
+        # すでに同じイベントが登録されている場合は、
+        # 「期間が短い方」を優先して残す（本番期間を採用したい）
+        prev = best_events.get(key)
+        if prev is None or days < prev[0]:
+            ev_new = dict(ev)  # 元のdictを壊さないようにコピー
+            ev_new["イベント（抜粋）"] = norm_title
+            best_events[key] = (days, ev_new)
+
+    # dict からイベントだけ取り出して返す
+    return [v[1] for v in best_events.values()]
+
+# 日付表記のゆれに対応した正規表現（日本語寄り）
+# 例：2025/10/1～2025/10/3, 2025年10月1日〜3日, 10/01(水)〜10/03(金) など
+RANGE_PATTERNS = [
+    r"(?P<y1>\d{4})[./年\-](?P<m1>\d{1,2})[./月\-](?P<d1>\d{1,2})[日]?\s*[～\-–~〜至からto～～─―]+\s*(?P<y2>\d{4})[./年\-](?P<m2>\d{1,2})[./月\-](?P<d2>\d{1,2})[日]?",
+    r"(?P<m1>\d{1,2})[./月\-](?P<d1>\d{1,2})[日]?\s*[～\-–~〜]+\s*(?P<m2>\d{1,2})[./月\-](?P<d2>\d{1,2})[日]?(\s*\((?P<w2>.)\))?",
+]
+SINGLE_PATTERNS = [
+    r"(?P<y>\d{4})[./年\-](?P<m>\d{1,2})[./月\-](?P<d>\d{1,2})[日]?",
+    r"(?P<m>\d{1,2})[./月\-](?P<d>\d{1,2})[日]?(?:\((?P<w>.)\))?",
+    # Zepp 形式: "2025 11.1" に対応（年+スペース+月.日）
+    r"(?P<y>\d{4})\s+(?P<m>\d{1,2})[./月\-](?P<d>\d{1,2})[日]?",
+]
+
+def _to_date(y, m, d):
+    return datetime.date(int(y), int(m), int(d))
+
+def _normalize_date_str(s: str) -> str:
+    # 全角や和文区切りをざっくりASCII寄せ
+    return (
+        s.replace("年", "/").replace("月", "/").replace("日", "")
+         .replace("．", ".").replace("ー", "-").replace("―", "-")
+         .replace("～", "~").replace("〜", "~").replace("：", ":")
+    )
+
+def _extract_date_ranges_jp(text: str, base_year: int):
+    """テキストから (start, end) の日付レンジ配列を抽出（単日は start=end）"""
+    t = _normalize_date_str(text)
+
+    ranges = []
+
+    # 範囲表記
+    for pat in RANGE_PATTERNS:
+        for m in re.finditer(pat, t):
+            gd = m.groupdict()
+            try:
+                if "y1" in gd and gd.get("y1") and gd.get("y2"):
+                    y1, m1, d1 = gd["y1"], gd["m1"], gd["d1"]
+                    y2, m2, d2 = gd["y2"], gd["m2"], gd["d2"]
+                else:
+                    # 年省略 → 同一年として扱う（年跨ぎは詳細ページで拾うのが確実）
+                    y1 = y2 = str(base_year)
+                    m1, d1 = gd["m1"], gd["d1"]
+                    m2, d2 = gd["m2"], gd["d2"]
+
+                a = _to_date(y1, m1, d1)
+                b = _to_date(y2, m2, d2)
+                if a <= b:
+                    ranges.append((a, b))
+            except Exception:
+                pass
+
+    # 単日表記
+    singles = []
+    for pat in SINGLE_PATTERNS:
+        for m in re.finditer(pat, t):
+            gd = m.groupdict()
+            try:
+                if gd.get("y"):
+                    d = _to_date(gd["y"], gd["m"], gd["d"])
+                else:
+                    d = _to_date(base_year, gd["m"], gd["d"])
+                singles.append(d)
+            except Exception:
+                pass
+
+    # 既存レンジに含まれていなければ単日→レンジ化
+    for d in singles:
+        if not any(a <= d <= b for a, b in ranges):
+            ranges.append((d, d))
+
+    return ranges
+
+# 取得結果はディスクにキャッシュ（サーバー再起動後も残る。TTL 切れは条件付き GET で再検証）
+EVENT_CACHE_DIR = os.environ.get("EVENT_CACHE_DIR", ".http_cache/events")
+EVENT_CACHE_TTL_SEC = float(os.environ.get("EVENT_CACHE_TTL_SEC", 6 * 60 * 60))
+
+# 全会場をスレッドで同時に取りに行き、FETCH_DEADLINE_SEC までに返ってきた分だけで描画する
+# 間に合わなかった会場は裏で取得を続け、次の再実行でキャッシュから使う
+FETCH_DEADLINE_SEC = 4.0
+FETCH_TIMEOUT_SEC = 10
+PER_HOST_CONNECTIONS = 2       # 同じホストへの同時接続数の上限
+FETCH_RETRY_AFTER_SEC = 60     # 取得に失敗した URL を取り直すまでの間隔
+
+
+def _make_session():
+    """keep-alive で使い回すセッション（ホストごとの接続数は PER_HOST_CONNECTIONS まで）"""
+    s = requests.Session()
+    s.headers.update({"User-Agent": "Mozilla/5.0"})
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=len(EVENT_SOURCES_JP), pool_maxsize=PER_HOST_CONNECTIONS, pool_block=True,
+    )
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+_page_cache = DiskHTTPCache(EVENT_CACHE_DIR, ttl=EVENT_CACHE_TTL_SEC, timeout=FETCH_TIMEOUT_SEC,
+                            session=_make_session())
+_fetch_pool = ThreadPoolExecutor(max_workers=len(EVENT_SOURCES_JP), thread_name_prefix="event-fetch")
+_fetch_lock = threading.Lock()
+_inflight = {}       # url -> (future, 待つ期限)
+_last_attempt = {}   # url -> 最後に取りに行った時刻
+_last_crawl = None   # (budget, (pages, pending)) … 直近の再実行での取得結果
+
+
+def _fetch_html(url: str) -> str:
+    return _page_cache.get(url)
+
+
+def fetch_event_pages(deadline_sec: float = FETCH_DEADLINE_SEC, budget=None):
+    """
+    全会場のページを返す：([(url, 会場, html), ...], 取得中の会場名リスト)
+    ・キャッシュが新しい会場は取りに行かない
+    ・それ以外は全会場同時に取りに行き、投入から deadline_sec までだけ待つ
+      （budget があればページの残り持ち時間でさらに切り詰める）
+    ・間に合わなかった会場は古いキャッシュ（無ければ空）で埋めて「取得中」として返す
+    ・落ちている会場はブレーカーで即失敗するので待たされない
+    ・同じ budget（＝同じ再実行）で呼ばれたら前回の結果をそのまま返す
+      （アプリは日付ごとに呼ぶので、キャッシュの確認と hit の記録は1回の描画で1回だけにする）
+    """
+    global _last_crawl
+    with _fetch_lock:
+        if budget is not None and _last_crawl is not None and _last_crawl[0] is budget:
+            pages, pending = _last_crawl[1]
+            return list(pages), list(pending)
+
+    if budget is not None:
+        deadline_sec = budget.clamp(deadline_sec)
+    now = time.time()
+    waiting = {}
+    with _fetch_lock:
+        for url, _ in EVENT_SOURCES_JP:
+            if _page_cache.is_fresh(_page_cache.read(url)):
+                record(endpoint_of(url), "hit")
+                continue
+            cur = _inflight.get(url)
+            if cur is None or (cur[0].done() and now - _last_attempt.get(url, 0) >= FETCH_RETRY_AFTER_SEC):
+                cur = (_fetch_pool.submit(_fetch_html, url), now + deadline_sec)
+                _inflight[url] = cur
+                _last_attempt[url] = now
+            waiting[url] = cur
+
+    for fut, until in waiting.values():
+        try:
+            fut.result(timeout=max(0.0, until - time.time()))
+        except Exception:
+            pass
+
+    pages, pending = [], []
+    for url, site in EVENT_SOURCES_JP:
+        cur = waiting.get(url)
+        if cur is not None and cur[0].done() and cur[0].exception() is None:
+            html = cur[0].result()
+        else:
+            if cur is not None and not cur[0].done():
+                pending.append(site)
+            ent = _page_cache.read(url)
+            html = ent["body"] if ent else ""
+        pages.append((url, site, html))
+    if budget is not None:
+        with _fetch_lock:
+            _last_crawl = (budget, (pages, pending))
+    return list(pages), list(pending)
+
+
+def pending_event_sources():
+    """取得がまだ終わっていない会場名"""
+    with _fetch_lock:
+        busy = {url for url, (fut, _) in _inflight.items() if not fut.done()}
+    return [site for url, site in EVENT_SOURCES_JP if url in busy]
+
+def _normalize_event_title(text: str) -> str:
+    """イベントタイトルを『重複判定用に標準化』する"""
+    t = text
+
+    # 改行・連続空白除去
+    t = " ".join(t.split())
+
+    # よく出るノイズ削除（ポイント会員・クレジット会員・お得情報…）
+    noise_words = [
+        "ポイント会員", "クレジット会員", "お得情報",
+        "NEW", "その他イベント",
+        "【館内入会限定】", "三井ショッピング", "三井ショッピン"
+    ]
+    for w in noise_words:
+        t = t.replace(w, "")
+
+    # 不要な日付列挙を削除（2025/11/22,2025/11/23,2025/11/24 の羅列）
+    t = re.sub(r"\d{4}/\d{1,2}/\d{1,2}(?:\([^)]*\))?(?:,|，)?", "", t)
+
+    # 追加：ユニクロ・GU 感謝祭は完全統一（最重要）
+    if "ユニクロ" in t and "感謝祭" in t:
+        return "ユニクロ・GU感謝祭（大抽選会）"
+
+    # 全角英数字 → 半角
+    t = t.translate(str.maketrans(
+        "０１２３４５６７８９ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ",
+        "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    ))
+
+    # スペース再整形
+    t = " ".join(t.split())
+
+    return t.strip()
+
+
+
+
+def parse_event_page(html: str, site: str, url: str, base_year: int):
+    """
+    1ページ分の HTML から日付つきのイベント候補を抜き出す
+    （見出し＋本文の塊を走査する汎用パターン。年省略の日付は base_year 扱い）
+    ノードごとに、そのノードで見つかった期間のレコードを出現順に並べたリストを返す
+    """
+    nodes = []
+    if not html:
+        return nodes
+    soup = BeautifulSoup(html, "html.parser")
+
+    for node in soup.find_all(["h1", "h2", "h3", "h4", "p", "li", "div", "a", "span"]):
+        text = " ".join(node.get_text(" ", strip=True).split())
+        if not text or len(text) < 6:
+            continue
+        title = text
+        # タイトル（抜粋）が長すぎる場合は適度に丸める
+        if len(title) > 120:
+            title = title[:117] + "..."
+        records = [{
+            "会場": site,
+            "開始日": a.isoformat(),
+            "終了日": b.isoformat(),
+            "イベント（抜粋）": title,
+            "リンク": url,
+        } for a, b in _extract_date_ranges_jp(text, base_year=base_year)]
+        if records:
+            nodes.append(records)
+    return nodes
+
+
+def _dedupe_events(records):
+    """完全重複除去（開始日×終了日×正規化タイトル）。タイトルは正規化後の文字列に置き換える"""
+    uniq, seen = [], set()
+    for h in records:
+        norm_title = _normalize_event_title(h["イベント（抜粋）"])
+
+        key = (h["開始日"], h["終了日"], norm_title)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        h2 = dict(h)
+        h2["イベント（抜粋）"] = norm_title
+        uniq.append(h2)
+    return uniq
+
+
+def _event_key(ev):
+    return (ev["会場"], ev["開始日"], ev["終了日"], ev["イベント（抜粋）"])
+
+
+class EventIndex:
+    """日付ごとのイベント一覧（絞り込み済み）を日付で引ける索引"""
+
+    def __init__(self, by_day):
+        # 日付の通し番号（toordinal）-> その日のイベントのリスト
+        self._by_day = dict(by_day)
+
+    def on(self, date: datetime.date):
+        """date に開催中のイベント"""
+        return list(self._by_day.get(date.toordinal(), []))
+
+    def between(self, start: datetime.date, end: datetime.date):
+        """start〜end のどこかにかかっているイベント（重複なし・日付順に初めて出た順）"""
+        found, seen = [], set()
+        for k in range(start.toordinal(), end.toordinal() + 1):
+            for ev in self._by_day.get(k, []):
+                key = _event_key(ev)
+                if key not in seen:
+                    seen.add(key)
+                    found.append(ev)
+        return found
+
+    def __len__(self):
+        return len({_event_key(ev) for evs in self._by_day.values() for ev in evs})
+
+
+def build_event_index(pages, base_year: int) -> EventIndex:
+    """
+    取得済みページ [(url, 会場, html), ...] から EventIndex を作る
+    日付ごとの結果は「その日を含む期間を各ノードから1件だけ（最初に見つかったもの）拾い、
+    重複除去して大規模イベントに絞る」で、日付ごとにページを走査していたときと同じになる
+    """
+    candidates = defaultdict(list)   # 日付の通し番号 -> その日の候補（ページ・ノード順）
+    for url, site, html in pages:
+        for records in parse_event_page(html, site, url, base_year):
+            covered = set()
+            for rec in records:
+                start = datetime.date.fromisoformat(rec["開始日"]).toordinal()
+                end = datetime.date.fromisoformat(rec["終了日"]).toordinal()
+                for k in range(start, end + 1):
+                    # そのノードからは1件だけ拾う（その日を含む最初の期間）
+                    if k not in covered:
+                        covered.add(k)
+                        candidates[k].append(rec)
+
+    by_day = {}
+    for k, recs in candidates.items():
+        found = _filter_big_events(_dedupe_events(recs))
+        if found:
+            by_day[k] = found
+    return EventIndex(by_day)
+
+
+_index_lock = threading.Lock()
+_index_cache = {}
+
+
+def get_event_index(base_year: int, budget=None) -> EventIndex:
+    """
+    base_year 用の EventIndex を返す
+    ページ内容が前回と同じなら解析し直さない（年ごと・ページ内容ごとにキャッシュ）
+    """
+    pages, _ = fetch_event_pages(budget=budget)
+    key = (base_year, tuple(hash(html) for _, _, html in pages))
+    with _index_lock:
+        idx = _index_cache.get(key)
+    if idx is None:
+        idx = build_event_index(pages, base_year)
+        with _index_lock:
+            # 同じ年の古い索引は捨てる
+            for k in [k for k in _index_cache if k[0] == base_year]:
+                del _index_cache[k]
+            _index_cache[key] = idx
+    return idx
+
+
+def events_on(date: datetime.date, budget=None):
+    """date に開催中の大規模イベント"""
+    return get_event_index(date.year, budget).on(date)
+
+
+def events_between(start: datetime.date, end: datetime.date, budget=None):
+    """start〜end にかかる大規模イベント（年をまたぐ場合は年ごとの索引をまとめる）"""
+    found, seen = [], set()
+    for year in range(start.year, end.year + 1):
+        a = max(start, datetime.date(year, 1, 1))
+        b = min(end, datetime.date(year, 12, 31))
+        for ev in get_event_index(year, budget).between(a, b):
+            key = _event_key(ev)
+            if key not in seen:
+                seen.add(key)
+                found.append(ev)
+    return found
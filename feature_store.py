@@ -0,0 +1,219 @@
+# feature_store.py
+# 予測時の「前週同曜日_売上」「売上_移動平均7日」を実績の日別総売上から引く
+# ・日別総売上（と その日の行数）を日付の通し番号 % RING_DAYS の輪（リングバッファ）で持つ
+#   → 任意の日の 7日前・直近7日の参照は添字計算だけ（O(1)）
+# ・実績の翌日から MAX_ROLL_DAYS 日までは、売上モデルの予測値を前に送って埋める
+#   （7日前しか見ないので 7日ずつまとめて1回で予測する。予測する日がその先なら送らない）
+#   それより先は 52週前の同じ曜日の実績（無ければ直近7日の平均）で代用する
+# ・daily_totals.npz に保存しておき、ingest_sales.py が実績を取り込むたびに差分だけ更新する
+#   （実績の取り込みで書き換わる生成物なので git では管理しない。無ければ履歴から作り直す）
+# 作り直しは
+#   python feature_store.py
+#
+# 単位について：学習データの 前週同曜日_売上 / 売上_移動平均7日 は店舗の日別総売上そのものだが、
+# 売上モデルの目的変数（学習スクリプトの 日別総売上）は「全行の売上の合計」＝ 総売上 × その日の行数。
+# 予測値を前に送るときは、直近の1日あたり行数で割って総売上の単位に戻す
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from file_utils import file_signature
+
+
+FEATURE_STORE_PATH = "daily_totals.npz"
+RING_DAYS = 800             # 2年前の同じ曜日まで引ける長さ
+LAG_DAYS = 7
+MA_DAYS = 7
+MAX_ROLL_DAYS = 28          # 予測値で前に送るのはここまで
+PERSISTENCE_DAYS = 364      # 52週前（同じ曜日）
+ROWS_WINDOW_DAYS = 28       # 1日あたり行数の平均をとる期間
+
+
+def day_number(d) -> int:
+    """日付 → 1970-01-01 からの日数"""
+    return int(np.datetime64(pd.Timestamp(d).date(), "D").astype(np.int64))
+
+
+class DailyTotalsRing:
+    """日別総売上のリングバッファ（最後の実績日から RING_DAYS 日前まで持つ）"""
+
+    def __init__(self, capacity: int = RING_DAYS):
+        self.capacity = capacity
+        self.values = np.full(capacity, np.nan)
+        self.rows = np.zeros(capacity, dtype=np.int32)
+        self.last = None   # 最後の実績日（日数）
+
+    def _inside(self, day: int) -> bool:
+        return self.last is not None and self.last - self.capacity < day <= self.last
+
+    def update(self, day, total: float, rows: int = 0):
+        """1日分の実績を入れる（古すぎる日は無視、先の日なら間の日を空にしてから進める）"""
+        day = day_number(day)
+        if self.last is None:
+            self.last = day
+        elif day > self.last:
+            for k in range(self.last + 1, min(day, self.last + self.capacity) + 1):
+                self.values[k % self.capacity] = np.nan
+                self.rows[k % self.capacity] = 0
+            self.last = day
+        elif day <= self.last - self.capacity:
+            return
+        self.values[day % self.capacity] = total
+        self.rows[day % self.capacity] = rows
+
+    def get(self, day: int) -> float:
+        return self.values[day % self.capacity] if self._inside(day) else np.nan
+
+    def rows_per_day(self) -> float:
+        """直近 ROWS_WINDOW_DAYS 日の1日あたり行数（予測値の単位換算用）"""
+        if self.last is None:
+            return 1.0
+        r = [self.rows[d % self.capacity] for d in range(self.last - ROWS_WINDOW_DAYS + 1, self.last + 1)]
+        r = [x for x in r if x > 0]
+        return float(np.mean(r)) if r else 1.0
+
+    def recent_mean(self) -> float:
+        if self.last is None:
+            return np.nan
+        v = [self.get(d) for d in range(self.last - MA_DAYS + 1, self.last + 1)]
+        v = [x for x in v if not np.isnan(x)]
+        return float(np.mean(v)) if v else np.nan
+
+    # ---- 予測用の特徴量 ----
+    def _value(self, day: int, rolled: dict) -> float:
+        """実績 → 前に送った予測 → 52週前の同じ曜日 の順に探す"""
+        v = self.get(day)
+        if not np.isnan(v):
+            return v
+        if day in rolled:
+            return rolled[day]
+        back = day - PERSISTENCE_DAYS
+        while self.last is not None and back > self.last - self.capacity:
+            v = self.get(back)
+            if not np.isnan(v):
+                return v
+            back -= PERSISTENCE_DAYS
+        return np.nan
+
+    def _lag_ma(self, day: int, rolled: dict, pending_from: int = None):
+        """
+        (前週同曜日_売上, 売上_移動平均7日)
+        pending_from 以降の日はまだ予測していない（まとめて予測中の週）ので、その日の前週同曜日の値で代用する
+        """
+        lag = self._value(day - LAG_DAYS, rolled)
+        if np.isnan(lag):
+            lag = self.recent_mean()
+        # 学習時の移動平均は当日を含む7日。当日の分は前週同曜日の値で代用する
+        window = []
+        for k in range(1, MA_DAYS):
+            d = day - k
+            if pending_from is not None and d >= pending_from:
+                d -= LAG_DAYS
+            window.append(self._value(d, rolled))
+        window.append(lag)
+        window = [x for x in window if not np.isnan(x)]
+        ma = float(np.mean(window)) if window else lag
+        return lag, ma
+
+    def lag_features(self, dates, predict_fn=None):
+        """
+        dates の (前週同曜日_売上, 売上_移動平均7日) の配列
+        predict_fn(日付のリスト, lag の配列, ma の配列) -> 売上モデルの予測値の配列 があれば、実績の翌日から
+        （最後の日付の前日 と 実績 + MAX_ROLL_DAYS の早い方）まで LAG_DAYS 日ずつまとめて予測して前に送る
+        dates の参照する日（最初の日付の LAG_DAYS 日前以降）がそこまで届かなければ送らない
+        """
+        days = [day_number(d) for d in dates]
+        rolled = {}
+        if predict_fn is not None and days and self.last is not None:
+            end = min(max(days) - 1, self.last + MAX_ROLL_DAYS)
+            if min(days) - LAG_DAYS <= end:
+                unit = self.rows_per_day()
+                for start in range(self.last + 1, end + 1, LAG_DAYS):
+                    block = list(range(start, min(start + LAG_DAYS, end + 1)))
+                    pairs = [self._lag_ma(day, rolled, pending_from=start) for day in block]
+                    preds = predict_fn([np.datetime64(day, "D").astype(object) for day in block],
+                                       np.array([p[0] for p in pairs]), np.array([p[1] for p in pairs]))
+                    for day, v in zip(block, preds):
+                        rolled[day] = float(v) / unit
+        pairs = [self._lag_ma(day, rolled) for day in days]
+        return (np.array([p[0] for p in pairs], dtype=np.float64),
+                np.array([p[1] for p in pairs], dtype=np.float64))
+
+    # ---- 保存 ----
+    def to_arrays(self) -> dict:
+        return {"values": self.values, "rows": self.rows,
+                "last": np.array(-1 if self.last is None else self.last, dtype=np.int64)}
+
+    @classmethod
+    def from_arrays(cls, z) -> "DailyTotalsRing":
+        ring = cls(capacity=len(z["values"]))
+        ring.values = np.array(z["values"], dtype=np.float64)
+        ring.rows = np.array(z["rows"], dtype=np.int32)
+        last = int(z["last"])
+        ring.last = None if last < 0 else last
+        return ring
+
+
+def daily_totals_from_history(df: pd.DataFrame):
+    """履歴（1商品1行）→ (日付 → 総売上, 日付 → 行数)。売上列は日別総売上（全行同じ値）"""
+    g = df.groupby("日付")
+    return g["売上"].first().astype(np.float64), g.size()
+
+
+def build_feature_store(df: pd.DataFrame = None, capacity: int = RING_DAYS) -> DailyTotalsRing:
+    if df is None:
+        from history_store import load_history
+        df = load_history(columns=["日付", "売上"])
+    totals, rows = daily_totals_from_history(df)
+    ring = DailyTotalsRing(capacity)
+    for day in totals.index:
+        ring.update(day, totals[day], int(rows[day]))
+    return ring
+
+
+def save_feature_store(ring: DailyTotalsRing, path: str = FEATURE_STORE_PATH):
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, **ring.to_arrays())
+    os.replace(tmp, path)
+
+
+_lock = threading.Lock()
+_cached = (None, None)   # (ファイルのシグネチャ, DailyTotalsRing)
+
+
+def load_feature_store(path: str = FEATURE_STORE_PATH) -> DailyTotalsRing:
+    """daily_totals.npz を読む（変わっていなければ前回のもの。無ければ履歴から作って保存）"""
+    global _cached
+    sig = file_signature(path)
+    with _lock:
+        if sig is not None and _cached[0] == sig:
+            return _cached[1]
+    if sig is None:
+        ring = build_feature_store()
+        save_feature_store(ring, path)
+        sig = file_signature(path)
+    else:
+        with np.load(path) as z:
+            ring = DailyTotalsRing.from_arrays(z)
+    with _lock:
+        _cached = (sig, ring)
+    return ring
+
+
+def update_feature_store(totals: dict, rows: dict = None, path: str = FEATURE_STORE_PATH) -> DailyTotalsRing:
+    """取り込んだ日の実績（日付 → 総売上 / 行数）だけ反映して保存する"""
+    ring = load_feature_store(path)
+    for day in sorted(totals):
+        ring.update(day, float(totals[day]), int((rows or {}).get(day, 0)))
+    save_feature_store(ring, path)
+    return ring
+
+
+if __name__ == "__main__":
+    r = build_feature_store()
+    save_feature_store(r)
+    print(f"✅ {FEATURE_STORE_PATH} を保存しました（最終実績日 {np.datetime64(r.last, 'D')}・"
+          f"1日あたり {r.rows_per_day():.1f} 行）")
@@ -0,0 +1,14 @@
+# file_utils.py
+# ファイル変更検知などの小さな共通処理
+# （モデル・天気履歴・メニュー一覧・日別総売上など、ファイルから作るキャッシュの読み直し判定に使う）
+
+import os
+
+
+def file_signature(path: str):
+    """ファイルの変更検知用シグネチャ（mtime と サイズ）。無ければ None。"""
+    try:
+        s = os.stat(path)
+    except OSError:
+        return None
+    return (s.st_mtime_ns, s.st_size)
@@ -0,0 +1,229 @@
+# history_store.py
+# 販売履歴 CSV（日本語ヘッダー）を列指向の Parquet に変換して持っておく
+# ・CSV と同じ場所に <CSV名>.parquet を作り、CSV の SHA-256 をメタデータに入れて同期を取る
+#   （CSV の mtime/サイズが変わったときだけハッシュを計算し、内容が変わっていれば作り直す）
+# ・型は小さく：商品名/カテゴリー/天気/季節などの文字列は category、フラグは int8、
+#   数量・金額・気温は float32、日付は datetime64 で日付順に並べ替え済み
+# ・pyarrow が無い環境では CSV を読んで同じ型に揃えるだけ（ファイルは作らない）
+# ・日別パーティション（HISTORY_DIR/YYYY/YYYY-MM-DD.parquet、ingest_sales.py が作る）があれば
+#   そちらを正とする（CSV は初期取り込みにだけ使う）
+# 変換だけ先にしておく場合は
+#   python history_store.py
+
+import os
+import sys
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:
+    pa = pq = None
+
+
+HISTORY_CSV_PATH = "商品別売上_統合_統合済v1.13.csv"
+HISTORY_DIR = os.environ.get("SALES_HISTORY_DIR", "sales_history")
+STORE_META_KEY = b"history_store"
+STORE_VERSION = 1
+
+# 履歴 CSV の列順（パーティションもこの順で書く）
+HISTORY_COLUMNS = [
+    "日付", "商品名", "カテゴリー", "販売商品数", "売上", "曜日", "祝日", "最高気温", "最低気温", "天気",
+    "休日フラグ", "特異日フラグ", "月", "季節", "イベント有無", "長期休みの種類", "長期休みフラグ",
+    "前週同曜日_売上", "売上_移動平均7日", "恒常メニュー", "シーズンメニュー", "商品数",
+]
+CATEGORY_COLUMNS = ["商品名", "カテゴリー", "天気", "季節", "曜日", "イベント有無", "長期休みの種類"]
+INT8_COLUMNS = ["祝日", "休日フラグ", "特異日フラグ", "月", "長期休みフラグ", "恒常メニュー", "シーズンメニュー"]
+FLOAT32_COLUMNS = ["販売商品数", "売上", "最高気温", "最低気温", "前週同曜日_売上", "売上_移動平均7日", "商品数"]
+
+
+def store_path_for(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".parquet"
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def compact_history(df: pd.DataFrame) -> pd.DataFrame:
+    """履歴を小さい型に揃え、日付順（同じ日は元の並び）に並べる"""
+    df = df.copy()
+    df["日付"] = pd.to_datetime(df["日付"], errors="coerce")
+    for c in CATEGORY_COLUMNS:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    for c in INT8_COLUMNS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0).astype(np.int8)
+    for c in FLOAT32_COLUMNS:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype(np.float32)
+    return df.sort_values("日付", kind="mergesort").reset_index(drop=True)
+
+
+def read_store_meta(store_path: str):
+    """Parquet に入れた同期情報（無ければ None）"""
+    if pq is None or not os.path.exists(store_path):
+        return None
+    try:
+        meta = pq.read_schema(store_path).metadata or {}
+        return json.loads(meta[STORE_META_KEY])
+    except Exception:
+        return None
+
+
+def write_store(df: pd.DataFrame, store_path: str, meta: dict):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    merged = dict(table.schema.metadata or {})
+    merged[STORE_META_KEY] = json.dumps(meta).encode("utf-8")
+    table = table.replace_schema_metadata(merged)
+    tmp = store_path + ".tmp"
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, store_path)
+
+
+def sync_history_store(csv_path: str = HISTORY_CSV_PATH, store_path: str = None) -> bool:
+    """
+    Parquet を CSV に合わせる。作り直したら True
+    CSV の mtime/サイズが前回と同じならハッシュも計算しない
+    """
+    if pq is None:
+        return False
+    store_path = store_path or store_path_for(csv_path)
+    st = os.stat(csv_path)
+    meta = read_store_meta(store_path)
+    if meta is not None and meta.get("version") == STORE_VERSION:
+        if (meta.get("csv_mtime_ns"), meta.get("csv_size")) == (st.st_mtime_ns, st.st_size):
+            return False
+        digest = file_sha256(csv_path)
+        if meta.get("csv_sha256") == digest:
+            # 内容は同じ（touch されただけ）：同期情報だけ更新
+            df = pd.read_parquet(store_path)
+        else:
+            df = compact_history(pd.read_csv(csv_path))
+    else:
+        digest = file_sha256(csv_path)
+        df = compact_history(pd.read_csv(csv_path))
+
+    write_store(df, store_path, {
+        "version": STORE_VERSION,
+        "csv": os.path.basename(csv_path),
+        "csv_sha256": digest,
+        "csv_mtime_ns": st.st_mtime_ns,
+        "csv_size": st.st_size,
+        "rows": len(df),
+    })
+    return True
+
+
+# ========= 日別パーティション =========
+def partition_path(day, history_dir: str = HISTORY_DIR) -> str:
+    day = pd.Timestamp(day)
+    return os.path.join(history_dir, f"{day.year:04d}", f"{day:%Y-%m-%d}.parquet")
+
+
+def partition_files(history_dir: str = HISTORY_DIR):
+    """日付順のパーティションファイル一覧"""
+    if not os.path.isdir(history_dir):
+        return []
+    files = []
+    for year in sorted(os.listdir(history_dir)):
+        ydir = os.path.join(history_dir, year)
+        if os.path.isdir(ydir):
+            files.extend(os.path.join(ydir, f) for f in sorted(os.listdir(ydir)) if f.endswith(".parquet"))
+    return files
+
+
+def read_partition(day, history_dir: str = HISTORY_DIR, columns=None):
+    """その日の行（パーティションが無ければ None）"""
+    path = partition_path(day, history_dir)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path, columns=columns)
+
+
+def write_partition(day, df: pd.DataFrame, history_dir: str = HISTORY_DIR):
+    """その日の行を書き直す（列は HISTORY_COLUMNS の順、型は compact_history に揃える）"""
+    path = partition_path(day, history_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df = compact_history(df[[c for c in HISTORY_COLUMNS if c in df.columns]])
+    tmp = path + ".tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+SNAPSHOT_NAME = "_snapshot.parquet"
+
+
+def _partition_day(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _stat_sig(path: str):
+    s = os.stat(path)
+    return (s.st_mtime_ns, s.st_size)
+
+
+def load_partitions(history_dir: str = HISTORY_DIR, columns=None) -> pd.DataFrame:
+    """
+    全パーティションをまとめて読む
+    まとめた結果は HISTORY_DIR/_snapshot.parquet に各パーティションの (mtime, サイズ) と一緒に置いておき、
+    次回は変わった日のパーティションだけ読み直して差し替える
+    """
+    files = {_partition_day(f): f for f in partition_files(history_dir)}
+    sigs = {day: list(_stat_sig(f)) for day, f in files.items()}
+    snap_path = os.path.join(history_dir, SNAPSHOT_NAME)
+    meta = read_store_meta(snap_path) or {}
+    old_sigs = meta.get("partitions", {}) if meta.get("version") == STORE_VERSION else {}
+
+    if old_sigs != sigs:
+        changed = [day for day, sig in sigs.items() if old_sigs.get(day) != sig]
+        if old_sigs and len(changed) < len(sigs):
+            base = pd.read_parquet(snap_path)
+            stale = set(changed) | (set(old_sigs) - set(sigs))
+            base = base[~base["日付"].dt.strftime("%Y-%m-%d").isin(stale)]
+            parts = [base] + [pd.read_parquet(files[day]) for day in changed]
+        else:
+            parts = [pd.read_parquet(f) for f in files.values()]
+        # 日ごとに違う category の中身をまとめ直す
+        df = compact_history(pd.concat([p.astype({c: object for c in CATEGORY_COLUMNS if c in p.columns})
+                                        for p in parts], ignore_index=True))
+        write_store(df, snap_path, {"version": STORE_VERSION, "partitions": sigs, "rows": len(df)})
+        return df[columns] if columns is not None else df
+    return pd.read_parquet(snap_path, columns=columns)
+
+
+def load_history(csv_path: str = HISTORY_CSV_PATH, columns=None) -> pd.DataFrame:
+    """
+    販売履歴（型を揃えた DataFrame）
+    日別パーティションがあればそれを読み、無ければ CSV の Parquet（古ければ先に作り直す）
+    """
+    if pq is not None and partition_files():
+        return load_partitions(columns=columns)
+    if pq is None:
+        df = compact_history(pd.read_csv(csv_path))
+        return df[columns] if columns is not None else df
+    store_path = store_path_for(csv_path)
+    sync_history_store(csv_path, store_path)
+    return pd.read_parquet(store_path, columns=columns)
+
+
+if __name__ == "__main__":
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else HISTORY_CSV_PATH
+    if partition_files():
+        df = load_history()
+        print(f"✅ {HISTORY_DIR}（{df['日付'].nunique()} 日・{len(df)} 行・メモリ "
+              f"{df.memory_usage(deep=True).sum() / 1e6:.1f} MB）")
+        sys.exit(0)
+    rebuilt = sync_history_store(csv_path)
+    df = load_history(csv_path)
+    print(f"✅ {store_path_for(csv_path)}（{len(df)} 行・メモリ {df.memory_usage(deep=True).sum() / 1e6:.1f} MB）"
+          + ("を作り直しました" if rebuilt else "は最新です"))
@@ -0,0 +1,105 @@
+# http_cache.py
+# 外部ページ用のディスクキャッシュ
+# ・本文と ETag / Last-Modified を URL ごとに JSON で保存（サーバー再起動後も残る）
+# ・TTL 内はキャッシュをそのまま返す
+# ・TTL 切れは If-None-Match / If-Modified-Since で再検証し、304 なら本文を使い回す
+# ・取得に失敗したら古い本文でも返す（無ければ空文字）
+# ・通信は resilience.resilient_get 経由（ブレーカー・再試行・持ち時間・件数の記録）
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+from resilience import endpoint_of, record, resilient_get
+
+
+DEFAULT_CACHE_DIR = ".http_cache"
+DEFAULT_TTL_SEC = 6 * 60 * 60
+
+
+class DiskHTTPCache:
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, ttl: float = DEFAULT_TTL_SEC,
+                 timeout: float = 10, headers=None, session=None):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.timeout = timeout
+        self.headers = dict(headers or {"User-Agent": "Mozilla/5.0"})
+        self.session = session
+        self._lock = threading.Lock()
+        # 直近に読んだ/書いたエントリ（同じ再実行中に何度もディスクを読まない）
+        self._mem = {}
+
+    def _path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def read(self, url: str):
+        """保存済みエントリ（無ければ None）"""
+        path = self._path(url)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            hit = self._mem.get(url)
+        if hit is not None and hit[0] == mtime:
+            return dict(hit[1])
+        try:
+            with open(path, encoding="utf-8") as f:
+                ent = json.load(f)
+        except Exception:
+            return None
+        with self._lock:
+            self._mem[url] = (mtime, ent)
+        return dict(ent)
+
+    def _write(self, url: str, ent: dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(url)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(ent, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        with self._lock:
+            self._mem[url] = (os.stat(path).st_mtime_ns, dict(ent))
+
+    def is_fresh(self, ent) -> bool:
+        return ent is not None and (time.time() - ent.get("fetched_at", 0)) < self.ttl
+
+    def get(self, url: str, timeout=None, budget=None) -> str:
+        """url の本文を返す（TTL 内はディスクから、切れていたら条件付き GET で再検証）"""
+        ent = self.read(url)
+        if self.is_fresh(ent):
+            record(endpoint_of(url), "hit")
+            return ent["body"]
+        record(endpoint_of(url), "miss")
+
+        headers = dict(self.headers)
+        if ent is not None:
+            if ent.get("etag"):
+                headers["If-None-Match"] = ent["etag"]
+            if ent.get("last_modified"):
+                headers["If-Modified-Since"] = ent["last_modified"]
+
+        r = resilient_get(url, timeout=timeout or self.timeout, budget=budget,
+                          session=self.session, headers=headers)
+        if r is None:
+            return ent["body"] if ent else ""
+
+        if r.status_code == 304 and ent is not None:
+            # 変更なし：本文はそのまま、取得時刻だけ更新
+            ent["fetched_at"] = time.time()
+            self._write(url, ent)
+            return ent["body"]
+        if r.ok:
+            ent = {
+                "url": url,
+                "body": r.text,
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }
+            self._write(url, ent)
+            return ent["body"]
+        return ent["body"] if ent else ""
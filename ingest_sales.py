@@ -0,0 +1,200 @@
+# ingest_sales.py
+# 日々の POS 書き出し（商品別の日別売上 CSV）を日別パーティションへ追記する
+#   python ingest_sales.py --init 商品別売上_統合_統合済v1.13.csv   … 既存の履歴 CSV から初回作成
+#   python ingest_sales.py 2026-02-01.csv [2026-02-02.csv ...]     … 新しい日の取り込み
+#
+# ・(日付, 商品名) が同じ行は後から来たものを正とする（同じ書き出しを2回入れても増えない）
+# ・書き直すのは「取り込んだ日」と、その日を参照する「前週同曜日_売上 / 売上_移動平均7日」の
+#   翌7日分のパーティションだけ（履歴全体は読み直さない）
+# ・書き出しに無い列は補う：カレンダー列は calendar_features、気温・天気は weather_history、
+#   カテゴリー・恒常/シーズン区分は menu_catalog から
+#
+# 売上の扱い：履歴 CSV と同じく「売上」はその日の店舗総売上（同じ日の全行に同じ値）
+# 書き出しの売上が行ごとに違う場合は商品別の金額とみなし、日ごとに合計して総売上にする
+# 前週同曜日_売上 = 7日前の総売上（その日が無ければその日の移動平均）
+# 売上_移動平均7日 = 当日を含む直近7日間（存在する日だけ）の総売上の平均
+# 取り込んだ日の総売上は予測時の特徴量ストア（feature_store, daily_totals.npz）にも反映する
+
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from calendar_features import calendar_columns
+from feature_store import LAG_DAYS, MA_DAYS, update_feature_store
+from history_store import (
+    HISTORY_COLUMNS, compact_history, partition_files, read_partition, write_partition,
+)
+from menu_catalog import load_menu_catalog
+from model_store import normalize_product_name
+from weather_history import load_weather_history
+
+
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+SEASON_NAMES = ["春", "夏", "秋", "冬"]
+
+
+def read_export(path: str) -> pd.DataFrame:
+    """POS 書き出しを読む（必須：日付・商品名・売上、数量は 販売商品数 か 商品数）"""
+    df = pd.read_csv(path)
+    missing = [c for c in ["日付", "商品名", "売上"] if c not in df.columns]
+    if "販売商品数" not in df.columns and "商品数" not in df.columns:
+        missing.append("販売商品数")
+    if missing:
+        raise ValueError(f"{path}: 必要な列がありません: {', '.join(missing)}")
+    df["日付"] = pd.to_datetime(df["日付"], errors="coerce")
+    return df.dropna(subset=["日付", "商品名"])
+
+
+def daily_totals_of(df: pd.DataFrame) -> pd.Series:
+    """日付 → 店舗総売上（全行同じ値ならそれ、行ごとに違えば合計）"""
+    sales = pd.to_numeric(df["売上"], errors="coerce")
+    g = sales.groupby(df["日付"])
+    return g.first().where(g.nunique() <= 1, g.sum())
+
+
+def derive_lag_ma(totals: pd.Series, days) -> pd.DataFrame:
+    """
+    days の 前週同曜日_売上 / 売上_移動平均7日 を総売上（日付 → 値）から計算する
+    totals には少なくとも days の 7日前〜当日が入っていること
+    """
+    idx = pd.DatetimeIndex(sorted(set(pd.to_datetime(days))))
+    full = pd.date_range(min(idx.min(), totals.index.min()), idx.max())
+    s = totals.reindex(full)
+    ma = s.rolling(MA_DAYS, min_periods=1).mean()
+    lag = s.shift(LAG_DAYS).fillna(ma)
+    return pd.DataFrame({"前週同曜日_売上": lag, "売上_移動平均7日": ma}).reindex(idx)
+
+
+def _fill_day_columns(day_rows: pd.DataFrame, day: pd.Timestamp, total: float) -> pd.DataFrame:
+    """書き出しに無い列を補って、履歴 CSV と同じ列構成にする"""
+    df = day_rows.copy()
+    df["売上"] = total
+    if "販売商品数" not in df.columns:
+        df["販売商品数"] = df["商品数"]
+    if "商品数" not in df.columns:
+        df["商品数"] = df["販売商品数"]
+
+    cal = calendar_columns([day.date()])
+    df["曜日"] = WEEKDAY_NAMES[int(cal["曜日"][0])]
+    df["季節"] = SEASON_NAMES[int(cal["季節"][0])]
+    for c in ["祝日", "休日フラグ", "特異日フラグ", "月", "長期休みフラグ"]:
+        df[c] = int(cal[c][0])
+
+    if not {"最高気温", "最低気温", "天気"} <= set(df.columns):
+        weather, tmax, tmin, found = load_weather_history().lookup([day])
+        df["最高気温"] = df.get("最高気温", tmax[0] if found[0] else np.nan)
+        df["最低気温"] = df.get("最低気温", tmin[0] if found[0] else np.nan)
+        df["天気"] = df.get("天気", weather[0] if found[0] else "")
+    if "イベント有無" not in df.columns:
+        df["イベント有無"] = "無"
+    if "長期休みの種類" not in df.columns:
+        df["長期休みの種類"] = "該当なし"
+
+    if not {"カテゴリー", "恒常メニュー", "シーズンメニュー"} <= set(df.columns):
+        items = {it["key"]: it for it in load_menu_catalog()["items"]}
+        info = [items.get(normalize_product_name(x), {}) for x in df["商品名"]]
+        if "カテゴリー" not in df.columns:
+            df["カテゴリー"] = [it.get("category", "") for it in info]
+        if "恒常メニュー" not in df.columns:
+            df["恒常メニュー"] = [int(it.get("constant", False)) for it in info]
+        if "シーズンメニュー" not in df.columns:
+            df["シーズンメニュー"] = [int(it.get("seasonal", False)) for it in info]
+
+    for c in ["前週同曜日_売上", "売上_移動平均7日"]:
+        df[c] = np.nan   # 後で derive_lag_ma の値を入れる
+    return df[HISTORY_COLUMNS]
+
+
+def _stored_total(day):
+    part = read_partition(day, columns=["売上"])
+    if part is None or part.empty:
+        return None
+    return float(part["売上"].iloc[0])
+
+
+def ingest(frames, log=print) -> dict:
+    """POS 書き出し（DataFrame のリスト）を取り込む。書き直した日付の一覧を返す"""
+    new = pd.concat(frames, ignore_index=True)
+    new = new.drop_duplicates(subset=["日付", "商品名"], keep="last")
+    new_totals = daily_totals_of(new)
+    days = sorted(new["日付"].unique())
+
+    # 1) 取り込む日：既存の行と (日付, 商品名) で突き合わせて差し替え
+    merged = {}
+    for day in days:
+        day = pd.Timestamp(day)
+        rows = _fill_day_columns(new[new["日付"] == day], day, float(new_totals[day]))
+        old = read_partition(day)
+        if old is not None:
+            keep = ~old["商品名"].astype(str).isin(set(rows["商品名"].astype(str)))
+            rows = pd.concat([old[keep].astype(object), rows.astype(object)], ignore_index=True)
+            rows["売上"] = float(new_totals[day])
+        merged[day] = rows
+
+    # 2) 派生列を計算し直す日：取り込んだ日とその翌 LAG_DAYS 日（パーティションがある日だけ）
+    affected = set(merged)
+    for day in days:
+        for k in range(1, LAG_DAYS + 1):
+            d = pd.Timestamp(day) + pd.Timedelta(days=k)
+            if d not in merged and read_partition(d, columns=["日付"]) is not None:
+                affected.add(d)
+
+    # 必要な総売上は 影響日の (LAG_DAYS) 日前〜最終日 だけ
+    lo = min(affected) - pd.Timedelta(days=LAG_DAYS)
+    hi = max(affected)
+    totals = {}
+    for d in pd.date_range(lo, hi):
+        if d in merged:
+            totals[d] = float(new_totals[d])
+        else:
+            t = _stored_total(d)
+            if t is not None:
+                totals[d] = t
+    derived = derive_lag_ma(pd.Series(totals, dtype=np.float64), sorted(affected))
+
+    # 3) 書き込み（取り込んだ日は全列、翌7日分は派生列だけ差し替え）
+    for day in sorted(affected):
+        rows = merged.get(day)
+        if rows is None:
+            rows = read_partition(day)
+        rows = rows.copy()
+        rows["前週同曜日_売上"] = derived.at[day, "前週同曜日_売上"]
+        rows["売上_移動平均7日"] = derived.at[day, "売上_移動平均7日"]
+        write_partition(day, rows)
+
+    update_feature_store({d: float(new_totals[d]) for d in merged}, {d: len(r) for d, r in merged.items()})
+    log(f"取り込み {len(merged)} 日（{len(new)} 行）・派生列の再計算 {len(affected)} 日")
+    return {"ingested": sorted(merged), "recomputed": sorted(affected)}
+
+
+def init_from_csv(csv_path: str, log=print):
+    """既存の履歴 CSV を日別パーティションに分ける（派生列は CSV の値のまま）"""
+    df = compact_history(pd.read_csv(csv_path))
+    df = df.dropna(subset=["日付"]).drop_duplicates(subset=["日付", "商品名"], keep="last")
+    for day, rows in df.groupby("日付", sort=True):
+        write_partition(day, rows)
+    log(f"✅ {csv_path} から {df['日付'].nunique()} 日分のパーティションを作りました")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="日別売上の取り込み（日別パーティションへ追記）")
+    ap.add_argument("files", nargs="*", help="POS 書き出し CSV")
+    ap.add_argument("--init", metavar="CSV", help="既存の履歴 CSV から初回作成する")
+    args = ap.parse_args(argv)
+
+    if args.init:
+        if partition_files():
+            print("[ERROR] 既にパーティションがあります（--init は初回だけ）")
+            return 1
+        init_from_csv(args.init)
+    if args.files:
+        ingest([read_export(p) for p in args.files])
+    if not args.init and not args.files:
+        ap.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
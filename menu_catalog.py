@@ -0,0 +1,145 @@
+# menu_catalog.py
+# メニュー一覧（恒常/シーズンの区分・カテゴリー・出力列の並び）を小さな JSON にまとめる
+# ・学習スクリプトがモデルと一緒に menu_catalog.json を書き出す
+# ・アプリはこれを読むだけ（販売履歴 CSV 全体を起動のたびに読まない）
+# ・JSON が無いときだけ履歴（history_store）の必要な列から作って保存する
+# ・内容は元の CSV だけで決まる（作成日時などは入れない）。生成物なので git では管理しない
+# 作り直しだけしたい場合は
+#   python menu_catalog.py
+
+import os
+import json
+import threading
+
+import pandas as pd
+
+from file_utils import file_signature
+from model_store import normalize_product_name
+from history_store import load_history
+
+
+MENU_CATALOG_PATH = "menu_catalog.json"
+MENU_SOURCE_CSV = "商品別売上_統合_統合済v1.13.csv"
+MENU_CSV_COLUMNS = ["商品名", "カテゴリー", "恒常メニュー", "シーズンメニュー"]
+
+# UI上で「恒常/シーズン」の扱いを強制したい商品がある場合はここで指定
+# 例：BLS を常に出すのではなく、シーズン選択式にしたい
+FORCE_SEASONAL_ITEMS = {
+    normalize_product_name("BLS ブルーレモンソーダ"),
+}
+
+# ========= 出力列（ご指定の順） =========
+FIXED_PRODUCT_COLUMNS = [
+    "01 PBA金の房プレミアムバナナミルク",
+    "02 BA完熟バナナミルク",
+    "03 STBAつぶつぶいちごバナナミルク",
+    "04 MIXトロピカルマンゴーミックス",
+    "05 KBケールバナナ",
+    "06 ACAIアサイースムージー",
+    "07 OP果実たっぷりオレンジパイン",
+    "08 KOPつぶつぶキウイオレンジパイン",
+    "09 BOCベリーベリーオレンジココナッツ",
+    "10 MGつぶつぶマンゴーミルク",
+    "11 KIWIごろごろキウイ",
+    "12 LMNゴクゴクレモネードソーダ",
+    "13 LLS搾りたてレモンライムソーダ",
+    "14 PGS搾りたてピンクグレープフルーツソーダ",
+    "BLS_ブルーレモンソーダ",
+    "SS 東京サンセットソーダ",
+    "GY グリークヨーグルト",
+    "SU100 君島農園すいか100%生絞りジュース",
+    "MS つぶつぶメロンシェイク",
+    "PS桃スムージー",
+    "SU100 あべ農園すいか100%生絞りジュース",
+    "NS100 切りたて梨100%生搾りジュース",
+    "KPS まるごと巨峰とパインスムージー",
+    "MK100 極早生みかん果汁100%ジュース",
+    "IMO 蜜いもミルクシェイク",
+    "APK_ざくざく果実の青りんごキウイ",
+    "【BF限定】GKB 黒ゴマきなこのバナナミルク",
+    "AP100 赤石農園りんご生絞りジュース",
+    "STY  国産つぶつぶいちごミルクヨーグルト",
+    "MK100 愛媛みかん100%生絞りジュース",
+    "MK100 青島みかん100%生絞りジュース",
+    "STつぶつぶあまおういちごミルク",
+    "SHI100不知火100%生絞りジュース",
+    "STY あまおういちごヨーグルト",
+]
+
+
+FIXED_PRODUCT_COLUMNS = [normalize_product_name(x) for x in FIXED_PRODUCT_COLUMNS]
+
+
+def _flag(values) -> bool:
+    return bool((pd.to_numeric(values, errors="coerce") == 1).any())
+
+
+def build_menu_catalog(df: pd.DataFrame, source: str = MENU_SOURCE_CSV) -> dict:
+    """販売履歴（商品名/カテゴリー/恒常メニュー/シーズンメニュー 列）からカタログを作る"""
+    items = []
+    for name, g in df.groupby("商品名", sort=False):
+        category = g["カテゴリー"].dropna() if "カテゴリー" in g.columns else pd.Series(dtype=object)
+        key = normalize_product_name(name)
+        items.append({
+            "key": key,
+            "name": name,
+            "category": category.mode().iloc[0] if len(category) else "",
+            "constant": _flag(g["恒常メニュー"]),
+            "seasonal": _flag(g["シーズンメニュー"]),
+            "force_seasonal": key in FORCE_SEASONAL_ITEMS,
+        })
+
+    # 並びは従来どおり：恒常は履歴での出現順、シーズンは名前順
+    constant_items = [normalize_product_name(x) for x in df[df["恒常メニュー"] == 1]["商品名"].unique().tolist()]
+    seasonal_items = [normalize_product_name(x) for x in df[df["シーズンメニュー"] == 1]["商品名"].unique().tolist()]
+    constant_items = [x for x in constant_items if x not in FORCE_SEASONAL_ITEMS]
+    seasonal_items = sorted(set(seasonal_items) | set(FORCE_SEASONAL_ITEMS))
+
+    return {
+        "source": os.path.basename(source),
+        "items": items,
+        "constant_items": constant_items,
+        "seasonal_items": seasonal_items,
+        "force_seasonal_items": sorted(FORCE_SEASONAL_ITEMS),
+        "column_order": FIXED_PRODUCT_COLUMNS,
+    }
+
+
+def build_menu_catalog_from_csv(csv_path: str = MENU_SOURCE_CSV) -> dict:
+    df = load_history(csv_path, columns=MENU_CSV_COLUMNS)
+    return build_menu_catalog(df, source=csv_path)
+
+
+def write_menu_catalog(path: str, catalog: dict) -> dict:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+    return catalog
+
+
+_lock = threading.Lock()
+_cached = (None, None)   # (ファイルのシグネチャ, カタログ)
+
+
+def load_menu_catalog(path: str = MENU_CATALOG_PATH, csv_path: str = MENU_SOURCE_CSV) -> dict:
+    """menu_catalog.json を読む（変わっていなければ前回のもの。無ければ履歴 CSV から作って保存）"""
+    global _cached
+    sig = file_signature(path)
+    with _lock:
+        if sig is not None and _cached[0] == sig:
+            return _cached[1]
+    if sig is None:
+        catalog = write_menu_catalog(path, build_menu_catalog_from_csv(csv_path))
+        sig = file_signature(path)
+    else:
+        with open(path, encoding="utf-8") as f:
+            catalog = json.load(f)
+    with _lock:
+        _cached = (sig, catalog)
+    return catalog
+
+
+if __name__ == "__main__":
+    cat = write_menu_catalog(MENU_CATALOG_PATH, build_menu_catalog_from_csv())
+    print(f"✅ {MENU_CATALOG_PATH} を保存しました（{len(cat['items'])} 商品）")
@@ -1,8 +1,27 @@
+# model.py
+# 旧形式（sales_model.pkl + product_models/*.pkl + product_model_paths.pkl）を
+# 学習し直さずに model_pack.bin へまとめ直す移行用スクリプト
+# （Windows で作った product_model_paths.pkl のパスもここで吸収する）
 import joblib, os
-d = joblib.load("product_model_paths.pkl")
-new_d = {}
+from model_store import (
+    MODEL_PACK_PATH, PRODUCT_PATHS_FILE, SALES_MODEL_PATH,
+    _unwrap_bundle, normalize_product_name, write_model_pack,
+)
+
+sales_model, sales_cols = _unwrap_bundle(joblib.load(SALES_MODEL_PATH))
+sales_entry = {"model": sales_model, "name": "売上モデル", "feature_cols": sales_cols,
+               "rows": None, "data_hash": None}
+
+d = joblib.load(PRODUCT_PATHS_FILE)
+entries = []
 for name, p in d.items():
-    base = os.path.basename(p)
-    new_d[name] = os.path.join("product_models", base).replace("\\", "/")
-joblib.dump(new_d, "product_model_paths.pkl")
-print("rewritten:", len(new_d), "entries")
+    path = os.path.join("product_models", os.path.basename(p.replace("\\", "/")))
+    if not os.path.exists(path):
+        print("skip (not found):", path)
+        continue
+    m, cols = _unwrap_bundle(joblib.load(path))
+    entries.append({"model": m, "name": name, "key": normalize_product_name(name),
+                    "feature_cols": cols, "rows": None, "data_hash": None})
+
+manifest = write_model_pack(MODEL_PACK_PATH, sales_entry, entries)
+print("packed:", len(entries), "products ->", MODEL_PACK_PATH, manifest["pack_version"])
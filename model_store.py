@@ -0,0 +1,414 @@
+# model_store.py
+# 売上モデル・商品別モデルの読み込みを1か所にまとめる
+# Streamlit の再実行ごとに pickle を読み直さないよう、プロセス内で共有して使う
+#
+# モデルの置き場所は2通り
+# 1) model_pack.bin（推奨）… 全モデルを1ファイルにまとめたパック（pickle なし）
+# 2) 旧形式 … sales_model.pkl + product_models/*.pkl + product_model_paths.pkl
+#
+# パックには全商品まとめて1つの「共通モデル」（商品・カテゴリーを XGBoost のカテゴリ変数にしたもの）を
+# 入れておくこともできる（manifest の "global"）。predict_products(use_global=True) で使う
+
+import os
+import json
+import mmap
+import time
+import struct
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import joblib
+
+from file_utils import file_signature
+
+
+SALES_MODEL_PATH = "sales_model.pkl"
+PRODUCT_PATHS_FILE = "product_model_paths.pkl"
+MODEL_PACK_PATH = "model_pack.bin"
+
+# ---- パック形式 ----
+# [MAGIC 8byte][format_version uint32][manifest長 uint64][manifest(JSON, UTF-8)][ブースター本体...]
+# manifest の各エントリの offset は「ブースター本体の先頭」からのバイト位置
+# ブースターは XGBoost ネイティブの UBJSON 形式（Booster.save_raw("ubj")）
+PACK_MAGIC = b"PFMPACK\x00"
+PACK_FORMAT_VERSION = 1
+_PACK_HEADER = struct.Struct("<8sIQ")
+
+# 共通モデルのカテゴリ変数の列名
+GLOBAL_PRODUCT_COL = "商品"
+GLOBAL_CATEGORY_COL = "カテゴリー"
+
+
+def normalize_product_name(name: str) -> str:
+    """商品名の表記ゆれを吸収（スペース→'_' に統一）。"""
+    return "_".join(str(name).split())
+
+
+def _unwrap_bundle(b):
+    """「モデル単体」または「{"model": ..., "feature_cols": ...}」を (model, feature_cols) にする"""
+    if isinstance(b, dict) and "model" in b:
+        return b["model"], b.get("feature_cols")
+    return b, None
+
+
+def _model_nbytes(model, path: str) -> int:
+    """モデルのメモリ使用量（概算）。XGBoost はブースターの生バイト数、取れなければファイルサイズ。"""
+    try:
+        return len(model.get_booster().save_raw())
+    except Exception:
+        pass
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def process_rss_bytes():
+    """プロセス全体の常駐メモリ（Linux のみ。取れなければ None）"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+
+# ========= モデルパック =========
+def booster_to_bytes(model) -> bytes:
+    """XGBRegressor / Booster を UBJSON のバイト列にする"""
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    return bytes(booster.save_raw("ubj"))
+
+
+def regressor_from_bytes(raw):
+    """UBJSON のバイト列から XGBRegressor を復元（pickle を使わない）"""
+    from xgboost import XGBRegressor
+    m = XGBRegressor()
+    m.load_model(bytearray(raw))
+    return m
+
+
+def write_model_pack(path: str, sales_entry, product_entries, extra=None, global_entry=None):
+    """
+    モデルパックを書き出す
+    sales_entry / product_entries / global_entry（共通モデル、任意）の各要素は
+      {"model": XGBRegressor or Booster, "name": 表示名, "feature_cols": [...], ...任意のメタ情報}
+    model 以外のキーはそのまま manifest に入る。書き込みは一時ファイル→置換で行う。
+    """
+    blobs = []
+    offset = 0
+
+    def _entry(e):
+        nonlocal offset
+        raw = e["raw"] if "raw" in e else booster_to_bytes(e["model"])
+        meta = {k: v for k, v in e.items() if k not in ("model", "raw")}
+        meta.update({"offset": offset, "length": len(raw), "format": "ubj"})
+        blobs.append(raw)
+        offset += len(raw)
+        return meta
+
+    manifest = {
+        "format_version": PACK_FORMAT_VERSION,
+        "pack_version": datetime.datetime.now().strftime("%Y%m%d-%H%M%S"),
+        "sales": _entry(sales_entry) if sales_entry is not None else None,
+        "products": [_entry(e) for e in product_entries],
+        "global": _entry(global_entry) if global_entry is not None else None,
+    }
+    if extra:
+        manifest.update(extra)
+
+    body = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PACK_HEADER.pack(PACK_MAGIC, PACK_FORMAT_VERSION, len(body)))
+        f.write(body)
+        for raw in blobs:
+            f.write(raw)
+    os.replace(tmp, path)
+    return manifest
+
+
+def read_pack_manifest(path: str):
+    """パックの manifest だけ読む（無い/壊れていれば None）"""
+    try:
+        with open(path, "rb") as f:
+            magic, version, n = _PACK_HEADER.unpack(f.read(_PACK_HEADER.size))
+            if magic != PACK_MAGIC or version != PACK_FORMAT_VERSION:
+                return None
+            return json.loads(f.read(n).decode("utf-8"))
+    except Exception:
+        return None
+
+
+class ModelPack:
+    """モデルパックを1つのファイルハンドル（mmap）で開き、ブースターを必要なときに取り出す"""
+
+    def __init__(self, path: str, signature=None):
+        self.path = path
+        self.signature = signature   # 開いたときのファイルのシグネチャ（レジストリが差し替え検知に使う）
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n = _PACK_HEADER.unpack(self._mm[:_PACK_HEADER.size])
+        if magic != PACK_MAGIC:
+            self.close()
+            raise ValueError(f"モデルパックではありません: {path}")
+        if version != PACK_FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"未対応のパック形式です: v{version}（{path}）")
+        start = _PACK_HEADER.size
+        self.manifest = json.loads(self._mm[start:start + n].decode("utf-8"))
+        self._data_start = start + n
+        self.products = {e["key"]: e for e in self.manifest.get("products", [])}
+        self.global_entry = self.manifest.get("global")
+
+    def raw(self, entry) -> bytes:
+        a = self._data_start + entry["offset"]
+        return self._mm[a:a + entry["length"]]
+
+    def load(self, entry):
+        return regressor_from_bytes(self.raw(entry))
+
+    def close(self):
+        try:
+            self._mm.close()
+        except Exception:
+            pass
+        self._f.close()
+
+
+class ModelRegistry:
+    """
+    モデルファイルをプロセス内で共有するレジストリ
+    ・model_pack.bin があればそれを使い、無ければ旧形式の pickle を読む
+    ・各ファイルは mtime/サイズが変わったときだけ読み直す
+    ・読み込み時間とモデルサイズ（概算）を記録して stats() で返す
+    ・商品モデルは predict で初めて必要になったときに読み込む（遅延読込）
+    ・恒常メニューなどは prefetch_async() で裏で先読みしておける
+    ・複数セッションから同時に呼ばれるのでロックで守る
+    """
+
+    def __init__(self, sales_path: str = SALES_MODEL_PATH, paths_file: str = PRODUCT_PATHS_FILE,
+                 pack_path: str = MODEL_PACK_PATH):
+        self.sales_path = sales_path
+        self.paths_file = paths_file
+        self.pack_path = pack_path
+        self._lock = threading.RLock()
+        # source -> {"sig", "model", "feature_cols", "load_seconds", "nbytes", "loaded_at", "label"}
+        self._entries = {}
+        # 同じモデルを同時に二重で読まないためのロック（(source, sig) 単位。読込が終わったら消す）
+        self._source_locks = {}
+        # 先読み中の商品（読み終わったら外す。失敗・未登録の商品も次の prefetch_async で試し直す）
+        self._prefetching = set()
+        self._paths_sig = None
+        self._product_paths = {}
+        self._pack = None
+        self._pack_sig = None
+
+    # ---- 読み込み元 ----
+    def pack(self):
+        """開いているモデルパック（無ければ None）。ファイルが差し替わったら開き直す"""
+        sig = file_signature(self.pack_path)
+        with self._lock:
+            if sig != self._pack_sig:
+                # 古いパックは明示的に閉じない：先読みや predict のスレッドがまだ読んでいることがあるので、
+                # 誰も参照しなくなったところで mmap ごと解放させる
+                # 古いパックから読んだモデルは捨てる（必要になったら新しいパックから読む）
+                for source in [s for s in self._entries if s.startswith("pack:")]:
+                    del self._entries[source]
+                self._pack = ModelPack(self.pack_path, sig) if sig is not None else None
+                self._pack_sig = sig
+            return self._pack
+
+    def _load(self, source: str, sig, loader, label: str):
+        """source のモデルを返す（未読込 or sig が変わったときだけ loader() を呼ぶ）"""
+        with self._lock:
+            ent = self._entries.get(source)
+            if ent is not None and ent["sig"] == sig:
+                return ent
+            # 古いパックからの読込と新しいパックからの読込は互いに待たせない
+            lock_key = (source, sig)
+            source_lock = self._source_locks.setdefault(lock_key, threading.Lock())
+
+        # 読込中は他のモデルを待たせない（ロックはモデル単位）
+        try:
+            with source_lock:
+                with self._lock:
+                    ent = self._entries.get(source)
+                    if ent is not None and ent["sig"] == sig:
+                        return ent
+                t0 = time.perf_counter()
+                model, cols, nbytes = loader()
+                ent = {
+                    "sig": sig,
+                    "model": model,
+                    "feature_cols": cols,
+                    "load_seconds": time.perf_counter() - t0,
+                    "nbytes": nbytes,
+                    "loaded_at": time.time(),
+                    "label": label,
+                }
+                with self._lock:
+                    self._entries[source] = ent
+                return ent
+        finally:
+            # 待っていたスレッドは読み終えたエントリ（失敗時は自分で読み直し）を使うので、ロックは残さない
+            with self._lock:
+                if self._source_locks.get(lock_key) is source_lock:
+                    del self._source_locks[lock_key]
+
+    def _load_pickle(self, path: str):
+        def loader():
+            model, cols = _unwrap_bundle(joblib.load(path))
+            return model, cols, _model_nbytes(model, path)
+        return self._load(path, file_signature(path), loader, os.path.basename(path))
+
+    def _load_from_pack(self, pack, entry, source: str):
+        def loader():
+            return pack.load(entry), entry.get("feature_cols"), entry["length"]
+        # sig は「どのパックから読んだか」。読込中に差し替わっても新しいパックの分と混ざらない
+        return self._load(source, pack.signature, loader, entry.get("name") or source)
+
+    # ---- 公開API ----
+    def sales(self):
+        """売上モデルと特徴量列を返す"""
+        pack = self.pack()
+        if pack is not None and pack.manifest.get("sales"):
+            ent = self._load_from_pack(pack, pack.manifest["sales"], "pack:sales")
+        else:
+            ent = self._load_pickle(self.sales_path)
+        return ent["model"], ent["feature_cols"]
+
+    def product_paths(self) -> dict:
+        """旧形式：正規化した商品名 → モデルパス（存在するものだけ）"""
+        sig = file_signature(self.paths_file)
+        with self._lock:
+            if sig != self._paths_sig:
+                raw = joblib.load(self.paths_file) if sig is not None else {}
+                self._product_paths = {
+                    normalize_product_name(name): path
+                    for name, path in raw.items()
+                    if os.path.exists(path)
+                }
+                self._paths_sig = sig
+            return self._product_paths
+
+    def has_product(self, key: str) -> bool:
+        """商品モデルがあるか（読み込みはしない）"""
+        pack = self.pack()
+        if pack is not None:
+            return key in pack.products
+        return key in self.product_paths()
+
+    def product(self, key: str):
+        """商品モデルと特徴量列を返す（初回だけ読み込む）。無ければ (None, None)"""
+        pack = self.pack()
+        if pack is not None:
+            entry = pack.products.get(key)
+            if entry is None:
+                return None, None
+            ent = self._load_from_pack(pack, entry, "pack:" + key)
+        else:
+            path = self.product_paths().get(key)
+            if path is None:
+                return None, None
+            ent = self._load_pickle(path)
+        return ent["model"], ent["feature_cols"]
+
+    def global_model(self):
+        """共通モデルと manifest のエントリ（パックに無ければ (None, None)）"""
+        pack = self.pack()
+        if pack is None or not pack.global_entry:
+            return None, None
+        ent = self._load_from_pack(pack, pack.global_entry, "pack:global")
+        return ent["model"], pack.global_entry
+
+    def _predict_global(self, keys, feats, out) -> list:
+        """
+        共通モデルが知っている商品を 日付×商品 の1つの表にして1回で予測し out に入れる
+        共通モデルで予測できなかった列の番号を返す
+        """
+        model, entry = self.global_model()
+        if model is None:
+            return list(range(len(keys)))
+        product_categories = entry["product_categories"]
+        known = [j for j, k in enumerate(keys) if k in product_categories]
+        if not known:
+            return list(range(len(keys)))
+
+        n = len(feats)
+        cols = [c for c in entry["feature_cols"] if c not in (GLOBAL_PRODUCT_COL, GLOBAL_CATEGORY_COL)]
+        X = feats[cols].iloc[np.tile(np.arange(n), len(known))].reset_index(drop=True)
+        known_keys = [keys[j] for j in known]
+        X[GLOBAL_PRODUCT_COL] = pd.Categorical(
+            np.repeat(known_keys, n), categories=entry["categories"][GLOBAL_PRODUCT_COL])
+        X[GLOBAL_CATEGORY_COL] = pd.Categorical(
+            np.repeat([product_categories[k] for k in known_keys], n),
+            categories=entry["categories"][GLOBAL_CATEGORY_COL])
+        out[:, known] = model.predict(X[entry["feature_cols"]]).reshape(len(known), n).T
+        done = set(known)
+        return [j for j in range(len(keys)) if j not in done]
+
+    def predict_products(self, keys, feats, max_workers: int = 4, use_global: bool = False):
+        """
+        商品ごとに全日付分をまとめて予測し、(日付数, 商品数) の配列で返す
+        ・feats は1日1行の特徴量 DataFrame（売上列は予測済みの値を入れておく）
+        ・モデルが無い商品の列は NaN
+        ・商品ごとの predict はスレッドで並列に回す（XGBoost は予測中 GIL を離す）
+        ・use_global なら共通モデルが知っている商品は共通モデルで1回に予測し、残りだけ商品別モデル
+        """
+        out = np.full((len(feats), len(keys)), np.nan)
+        todo = self._predict_global(keys, feats, out) if use_global else list(range(len(keys)))
+
+        def _one(j):
+            model, cols = self.product(keys[j])
+            if model is None:
+                return
+            X = feats[cols] if cols else feats.drop(columns=["繁忙期フラグ"])
+            out[:, j] = model.predict(X)
+
+        if max_workers and max_workers > 1 and len(todo) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as ex:
+                list(ex.map(_one, todo))
+        else:
+            for j in todo:
+                _one(j)
+        return out
+
+    def prefetch_async(self, keys):
+        """keys の商品モデルをバックグラウンドで先読みする（先読み中の商品は重ねて積まない）"""
+        with self._lock:
+            todo = [k for k in keys if k not in self._prefetching]
+            self._prefetching.update(todo)
+        if not todo:
+            return None
+
+        def _run():
+            for k in todo:
+                try:
+                    self.product(k)
+                except Exception:
+                    # 先読みの失敗は predict 時の読み込みで改めて表に出す
+                    pass
+                finally:
+                    with self._lock:
+                        self._prefetching.discard(k)
+
+        th = threading.Thread(target=_run, name="model-prefetch", daemon=True)
+        th.start()
+        return th
+
+    def stats(self) -> list:
+        """読み込み済みモデルごとの読込時間・サイズ（表示用）"""
+        with self._lock:
+            rows = []
+            for ent in self._entries.values():
+                rows.append({
+                    "モデル": ent["label"],
+                    "読込時間(秒)": round(ent["load_seconds"], 3),
+                    "サイズ(MB)": round(ent["nbytes"] / 1024 / 1024, 2),
+                    "読込時刻": time.strftime("%H:%M:%S", time.localtime(ent["loaded_at"])),
+                })
+            return rows
@@ -0,0 +1,180 @@
+# resilience.py
+# 外部通信（天気 API・会場サイト）の共通ラッパー
+# ・ホストごとのサーキットブレーカー：連続で失敗したホストは COOLOFF_SEC の間呼ばずに即失敗
+# ・失敗時はジッター付きバックオフで少しだけ再試行
+# ・ページ全体の持ち時間（TimeBudget）を超えそうなら通信せずに諦める
+# ・ホストごとの hit/miss/ok/timeout/error/skipped 件数を数える（サイドバーで表示）
+# ブレーカーと件数はプロセス全体で共有（再実行・セッションをまたいで効く）
+
+import time
+import random
+import threading
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+import requests
+
+
+FAILURE_THRESHOLD = 3      # この回数続けて失敗したらブレーカーを開く
+COOLOFF_SEC = 60           # 開いたブレーカーを試しに閉じるまでの時間
+DEFAULT_RETRIES = 1        # 失敗時の再試行回数（初回を含まない）
+BACKOFF_BASE_SEC = 0.3     # 再試行までの待ち（BACKOFF_BASE_SEC * 2^n にジッターをかける）
+PAGE_BUDGET_SEC = 8.0      # 1回の再実行で外部通信に使ってよい時間
+MIN_FAILURE_WAIT_SEC = 2.0 # 持ち時間で切り詰めても、これ以上待ってのタイムアウトはホストの失敗に数える
+
+METRIC_KINDS = ["hit", "miss", "ok", "timeout", "error", "skipped"]
+
+
+class TimeBudget:
+    """1回の再実行（ページ描画）で使える残り時間"""
+
+    def __init__(self, total_sec: float = PAGE_BUDGET_SEC):
+        self.total = total_sec
+        self.deadline = time.monotonic() + total_sec
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def clamp(self, timeout: float) -> float:
+        """timeout を残り時間で切り詰める"""
+        return min(timeout, self.remaining())
+
+
+class CircuitBreaker:
+    """ホスト1つ分のブレーカー（closed → open → 期限後に1回だけ試す half-open）"""
+
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, cooloff: float = COOLOFF_SEC):
+        self.threshold = threshold
+        self.cooloff = cooloff
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.trial or time.monotonic() - self.opened_at < self.cooloff:
+                return False
+            # 冷却期間が明けたら1本だけ通して様子を見る
+            self.trial = True
+            return True
+
+    def release(self):
+        """half-open の試し枠を、結果を判定せずに返す"""
+        with self._lock:
+            self.trial = False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if self.trial or time.monotonic() - self.opened_at >= self.cooloff:
+                return "half-open"
+            return "open"
+
+
+_lock = threading.Lock()
+_breakers = {}
+_metrics = defaultdict(Counter)
+
+
+def endpoint_of(url: str) -> str:
+    return urlsplit(url).netloc or url
+
+
+def breaker_for(endpoint: str) -> CircuitBreaker:
+    with _lock:
+        br = _breakers.get(endpoint)
+        if br is None:
+            br = _breakers[endpoint] = CircuitBreaker()
+        return br
+
+
+def record(endpoint: str, kind: str, n: int = 1):
+    with _lock:
+        _metrics[endpoint][kind] += n
+
+
+def metrics_rows():
+    """サイドバー表示用：ホストごとの件数とブレーカー状態"""
+    with _lock:
+        snapshot = {ep: dict(c) for ep, c in _metrics.items()}
+        endpoints = sorted(set(snapshot) | set(_breakers))
+    rows = []
+    for ep in endpoints:
+        row = {"接続先": ep, "状態": breaker_for(ep).state()}
+        for k in METRIC_KINDS:
+            row[k] = snapshot.get(ep, {}).get(k, 0)
+        rows.append(row)
+    return rows
+
+
+def _is_server_error(r) -> bool:
+    return r.status_code >= 500 or r.status_code == 429
+
+
+def resilient_get(url: str, *, timeout: float = 10, budget: TimeBudget = None,
+                  retries: int = DEFAULT_RETRIES, session=None, **kwargs):
+    """
+    ブレーカー・再試行・持ち時間つきの GET
+    成功（5xx/429 以外）なら Response、諦めたら None を返す（例外は投げない）
+    """
+    endpoint = endpoint_of(url)
+    br = breaker_for(endpoint)
+    getter = session.get if session is not None else requests.get
+
+    for attempt in range(retries + 1):
+        if not br.allow():
+            record(endpoint, "skipped")
+            return None
+        t = budget.clamp(timeout) if budget is not None else timeout
+        if t <= 0:
+            # 持ち時間切れ：ホストのせいではないのでブレーカーは動かさない
+            br.release()
+            record(endpoint, "skipped")
+            return None
+
+        try:
+            r = getter(url, timeout=t, **kwargs)
+        except requests.Timeout:
+            record(endpoint, "timeout")
+            if t < min(timeout, MIN_FAILURE_WAIT_SEC):
+                # 持ち時間の残りわずかで切り詰めた待ち時間でのタイムアウトはホストの故障扱いにしない
+                br.release()
+                return None
+            br.failure()
+        except Exception:
+            record(endpoint, "error")
+            br.failure()
+        else:
+            if not _is_server_error(r):
+                record(endpoint, "ok")
+                br.success()
+                return r
+            record(endpoint, "error")
+            br.failure()
+
+        if attempt < retries:
+            wait = BACKOFF_BASE_SEC * (2 ** attempt) * random.uniform(0.5, 1.5)
+            if budget is not None and wait >= budget.remaining():
+                break
+            time.sleep(wait)
+    return None
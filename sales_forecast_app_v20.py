@@ -4,339 +4,22 @@
 import streamlit as st
 import pandas as pd
 import datetime
-import requests
-import joblib
-import os
 import numpy as np
-import jpholiday
 import calendar  
-
-
-def normalize_product_name(name: str) -> str:
-    """商品名の表記ゆれを吸収（スペース→'_' に統一）。"""
-    return "_".join(str(name).split())
-
-# UI上で「恒常/シーズン」の扱いを強制したい商品がある場合はここで指定
-# 例：BLS を常に出すのではなく、シーズン選択式にしたい
-FORCE_SEASONAL_ITEMS = {
-    normalize_product_name("BLS ブルーレモンソーダ"),
-}
-
-# --- 日本語サイトのイベント プレビュー（ビッグサイト/ダイバーシティ/お台場） ---
-import re
 from functools import lru_cache
-from bs4 import BeautifulSoup
-
-# 収集対象URL（日本語のみ）
-EVENT_SOURCES_JP = [
-    # 東京ビッグサイト（イベント情報）
-    ("https://www.bigsight.jp/visitor/event/", "東京ビッグサイト"),
-    # ダイバーシティ東京プラザ（イベント・キャンペーン）
-    ("https://mitsui-shopping-park.com/divercity-tokyo/event/", "ダイバーシティ東京プラザ"),
-    # お台場 公式ポータル（イベント一覧・カレンダー）
-    ("https://www.tokyo-odaiba.net/event_index/", "お台場（公式一覧）"),
-    ("https://www.tokyo-odaiba.net/event_calender/", "お台場（公式カレンダー）"),
-    # Zepp DiverCity（ライブスケジュール）
-    ("https://www.zepp.co.jp/hall/divercity/schedule/", "Zepp DiverCity"),
-]
-
-# --------------------------------------------
-# 大規模イベントだけに絞るフィルタ関数
-# --------------------------------------------
-BIG_EVENT_KEYWORDS = [
-    "フェス", "フェスタ", "祭",
-    "博", "博覧会", "展示会", "見本市",
-    "エキスポ", "EXPO",
-    "コミックマーケット", "コミケ",
-    "フェア", "ショー",
-    "花火","花火大会","HANABI",
-    "ライブ", "LIVE", "ツアー", "TOUR", "コンサート",
-]
-
-def _filter_big_events(events):
-    """
-    本当に人が多く来る大規模イベントだけに絞るフィルタ
-    ・UIテキスト/商談系を除外
-    ・お台場たこ焼きミュージアム系など常設寄り企画を除外
-    ・デザインフェスタ／アミューズメントエキスポ等はタイトルを正規化して重複削除
-    ・同じイベント（会場×タイトル）は「期間が一番短いもの」だけ残す
-      → デザフェスみたいに 10/04〜11/15 とか 11/14〜11/30 が混在しても、
-         本番の 11/15〜11/16 だけを採用する狙い
-    """
-    # サイトのUIテキスト・検索説明・商談系など、明らかにイベント名じゃないもの
-    noise_keywords = [
-        "アクセス", "フロアマップ", "イベント情報", "ショップ＆レストラン","エリアマップ","その他","遊び・エンタメ","利用施設",
-        "イベント検索", "日付検索", "検索結果",
-        "カレンダー", "カレンダーから探す",
-        "ジャンル", "条件選択",
-        "カテゴリーから探す", "キーワードから探す",
-        "年間の主要イベント",
-        "イベント・キャンペーン",
-        "入場区分",     # 商談系のヘッダごと全部カット
-        "開催期間",     # 「開催期間 2025年…」だけの行をカット
-        "開催時間",     # 時間だけの行
-        "商談日時",     # 商談日時だけの行
-        # ※「エ リ ア マ ッ プ」はタイトルにも含まれるのでここには入れない
-    ]
-
-    # 日常寄りのロングラン企画（売上にあまり効かなそうなもの）
-    # ただしタイトルに「東京ビッグサイト」が含まれる場合は残したいので条件で絞る
-    small_odaiba_keywords = [
-        "お台場たこ焼きミュージアム",
-        "台場一丁目商店街",
-        "デックス東京ビーチ",
-    ]
-
-    # key = (会場, 正規化タイトル) → (期間日数, イベントdict)
-    # で管理して、「同じイベント」は一番短い期間だけ残す
-    best_events = {}
-
-    for ev in events:
-        title = ev.get("イベント（抜粋）", "")
-        venue = ev.get("会場", "")
-        start_s = ev.get("開始日") or ""
-        end_s = ev.get("終了日") or ""
-
-        # 0) タイトルがスカスカなら捨てる
-        if not title or len(title) < 6:
-            continue
-
-        # 1) UIテキスト・説明文っぽいものは即除外
-        if any(k in title for k in noise_keywords):
-            continue
-
-        # 1.5) 「2025-11-14 ～ 2025-11-15 東京ビッグサイト」みたいな
-        #      日付＋会場だけで、イベント名が無さそうな行を除外
-        if re.match(r"\d{4}-\d{2}-\d{2}\s*～\s*\d{4}-\d{2}-\d{2}", title):
-            continue
-
-        # 2) 期間（日数）を計算（失敗したら 9999 日扱い）
-        try:
-            start = datetime.date.fromisoformat(start_s)
-            end = datetime.date.fromisoformat(end_s)
-            days = (end - start).days + 1
-        except Exception:
-            start = end = None
-            days = 9999
-
-        # 3) お台場の常設寄り企画をカット
-        #    ただしタイトルに「東京ビッグサイト」がある場合は残す
-        if any(k in title for k in small_odaiba_keywords) and "東京ビッグサイト" not in title:
-            continue
-
-        # 4) どの程度「大きいイベント」とみなすか
-        keep = False
-
-        # 4-1) 東京ビッグサイト本体 or タイトルにビッグサイトと書いてある → 大規模扱いで残す
-        if venue == "東京ビッグサイト" or "東京ビッグサイト" in title:
-            keep = True
-        else:
-            # 4-2) それ以外の会場（ダイバーシティ・防災公園など）
-            #      10日以上続く長期企画は、常設寄りとして除外
-            if days >= 10:
-                keep = False
-            else:
-                # 「フェス」「エキスポ」など “イベントっぽい” キーワードがあるものだけ残す
-                if any(k in title for k in BIG_EVENT_KEYWORDS):
-                    keep = True
-
-        if not keep:
-            continue
-
-        # 5) タイトル正規化（重複削除用＋表示用の整理）
-        norm_title = title
-
-        # デザフェス
-        if "デザインフェスタ" in norm_title:
-            norm_title = "デザインフェスタ vol.62 ＜東京ビッグサイト＞"
-        # アミューズメントエキスポ
-        elif "アミューズメント エキスポ" in norm_title:
-            norm_title = "アミューズメント エキスポ 2025 ＜東京ビッグサイト＞"
-        # プロジェクションマッピング
-        elif "プロジェクションマッピングアワード" in norm_title:
-            norm_title = "東京国際プロジェクションマッピングアワード Vol.10"
-        # 防災フェスタ
-        elif "防災フェスタ" in norm_title:
-            norm_title = "防災フェスタ2025「備蓄を考える」"
-
-        key = (venue, norm_title)
-
-        # すでに同じイベントが登録されている場合は、
-        # 「期間が短い方」を優先して残す（本番期間を採用したい）
-        prev = best_events.get(key)
-        if prev is None or days < prev[0]:
-            ev_new = dict(ev)  # 元のdictを壊さないようにコピー
-            ev_new["イベント（抜粋）"] = norm_title
-            best_events[key] = (days, ev_new)
-
-    # dict からイベントだけ取り出して返す
-    return [v[1] for v in best_events.values()]
-
-# 日付表記のゆれに対応した正規表現（日本語寄り）
-# 例：2025/10/1～2025/10/3, 2025年10月1日〜3日, 10/01(水)〜10/03(金) など
-RANGE_PATTERNS = [
-    r"(?P<y1>\d{4})[./年\-](?P<m1>\d{1,2})[./月\-](?P<d1>\d{1,2})[日]?\s*[～\-–~〜至からto～～─―]+\s*(?P<y2>\d{4})[./年\-](?P<m2>\d{1,2})[./月\-](?P<d2>\d{1,2})[日]?",
-    r"(?P<m1>\d{1,2})[./月\-](?P<d1>\d{1,2})[日]?\s*[～\-–~〜]+\s*(?P<m2>\d{1,2})[./月\-](?P<d2>\d{1,2})[日]?(\s*\((?P<w2>.)\))?",
-]
-SINGLE_PATTERNS = [
-    r"(?P<y>\d{4})[./年\-](?P<m>\d{1,2})[./月\-](?P<d>\d{1,2})[日]?",
-    r"(?P<m>\d{1,2})[./月\-](?P<d>\d{1,2})[日]?(?:\((?P<w>.)\))?",
-    # Zepp 形式: "2025 11.1" に対応（年+スペース+月.日）
-    r"(?P<y>\d{4})\s+(?P<m>\d{1,2})[./月\-](?P<d>\d{1,2})[日]?",
-]
-
-def _to_date(y, m, d):
-    return datetime.date(int(y), int(m), int(d))
-
-def _normalize_date_str(s: str) -> str:
-    # 全角や和文区切りをざっくりASCII寄せ
-    return (
-        s.replace("年", "/").replace("月", "/").replace("日", "")
-         .replace("．", ".").replace("ー", "-").replace("―", "-")
-         .replace("～", "~").replace("〜", "~").replace("：", ":")
-    )
-
-def _extract_date_ranges_jp(text: str, base_year: int):
-    """テキストから (start, end) の日付レンジ配列を抽出（単日は start=end）"""
-    t = _normalize_date_str(text)
-
-    ranges = []
-
-    # 範囲表記
-    for pat in RANGE_PATTERNS:
-        for m in re.finditer(pat, t):
-            gd = m.groupdict()
-            try:
-                if "y1" in gd and gd.get("y1") and gd.get("y2"):
-                    y1, m1, d1 = gd["y1"], gd["m1"], gd["d1"]
-                    y2, m2, d2 = gd["y2"], gd["m2"], gd["d2"]
-                else:
-                    # 年省略 → 同一年として扱う（年跨ぎは詳細ページで拾うのが確実）
-                    y1 = y2 = str(base_year)
-                    m1, d1 = gd["m1"], gd["d1"]
-                    m2, d2 = gd["m2"], gd["d2"]
-
-                a = _to_date(y1, m1, d1)
-                b = _to_date(y2, m2, d2)
-                if a <= b:
-                    ranges.append((a, b))
-            except Exception:
-                pass
-
-    # 単日表記
-    singles = []
-    for pat in SINGLE_PATTERNS:
-        for m in re.finditer(pat, t):
-            gd = m.groupdict()
-            try:
-                if gd.get("y"):
-                    d = _to_date(gd["y"], gd["m"], gd["d"])
-                else:
-                    d = _to_date(base_year, gd["m"], gd["d"])
-                singles.append(d)
-            except Exception:
-                pass
-
-    # 既存レンジに含まれていなければ単日→レンジ化
-    for d in singles:
-        if not any(a <= d <= b for a, b in ranges):
-            ranges.append((d, d))
-
-    return ranges
-
-@lru_cache(maxsize=64)
-def _fetch_html(url: str) -> str:
-    try:
-        r = requests.get(url, timeout=10, headers={"User-Agent": "Mozilla/5.0"})
-        if r.ok:
-            return r.text
-    except Exception:
-        pass
-    return ""
-
-def _normalize_event_title(text: str) -> str:
-    """イベントタイトルを『重複判定用に標準化』する"""
-    t = text
-
-    # 改行・連続空白除去
-    t = " ".join(t.split())
-
-    # よく出るノイズ削除（ポイント会員・クレジット会員・お得情報…）
-    noise_words = [
-        "ポイント会員", "クレジット会員", "お得情報",
-        "NEW", "その他イベント",
-        "【館内入会限定】", "三井ショッピング", "三井ショッピン"
-    ]
-    for w in noise_words:
-        t = t.replace(w, "")
-
-    # 不要な日付列挙を削除（2025/11/22,2025/11/23,2025/11/24 の羅列）
-    t = re.sub(r"\d{4}/\d{1,2}/\d{1,2}(?:\([^)]*\))?(?:,|，)?", "", t)
-
-    # 追加：ユニクロ・GU 感謝祭は完全統一（最重要）
-    if "ユニクロ" in t and "感謝祭" in t:
-        return "ユニクロ・GU感謝祭（大抽選会）"
-
-    # 全角英数字 → 半角
-    t = t.translate(str.maketrans(
-        "０１２３４５６７８９ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ",
-        "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-    ))
-
-    # スペース再整形
-    t = " ".join(t.split())
-
-    return t.strip()
-
-
-def _scan_event_pages_jp(target_date: datetime.date):
-    """上記日本語ページを走査し、target_date を含むイベント候補を返す"""
-    hits = []
-    for url, site in EVENT_SOURCES_JP:
-        html = _fetch_html(url)
-        if not html:
-            continue
-        soup = BeautifulSoup(html, "html.parser")
-
-        # 大まかに見出し＋本文の塊を走査（サイト構造に依らず拾える汎用パターン）
-        for node in soup.find_all(["h1", "h2", "h3", "h4", "p", "li", "div", "a", "span"]):
-            text = " ".join(node.get_text(" ", strip=True).split())
-            if not text or len(text) < 6:
-                continue
-            ranges = _extract_date_ranges_jp(text, base_year=target_date.year)
-            for a, b in ranges:
-                if a <= target_date <= b:
-                    title = text
-                    # タイトル（抜粋）が長すぎる場合は適度に丸める
-                    if len(title) > 120:
-                        title = title[:117] + "..."
-                    hits.append({
-                        "会場": site,
-                        "開始日": a.isoformat(),
-                        "終了日": b.isoformat(),
-                        "イベント（抜粋）": title,
-                        "リンク": url,
-                    })
-                    break  # そのノードからは1件だけ拾う
-
-    # 完全重複除去（開始日×終了日×正規化タイトル）
-    uniq, seen = [], set()
-    for h in hits:
-        norm_title = _normalize_event_title(h["イベント（抜粋）"])
-
-        key = (h["開始日"], h["終了日"], norm_title)
-        if key in seen:
-            continue
-        seen.add(key)
-
-        h2 = dict(h)
-        h2["イベント（抜粋）"] = norm_title
-        uniq.append(h2)
 
-    return uniq
-
-
-def render_event_calendar(selected_dates):
+from model_store import ModelRegistry, normalize_product_name, process_rss_bytes
+from calendar_features import build_feature_frame, calendar_columns
+# --- 日本語サイトのイベント プレビュー（ビッグサイト/ダイバーシティ/お台場） ---
+from event_sources import events_between, events_on, pending_event_sources
+from resilience import TimeBudget, metrics_rows
+from weather_store import forecast_for
+from weather_history import load_weather_history
+from climatology import climatology_defaults
+from menu_catalog import load_menu_catalog
+from feature_store import load_feature_store
+
+def render_event_calendar(selected_dates, budget=None):
     """bestcalendar風：1週の中でイベントをレーンに詰めて横バー表示"""
     if not selected_dates:
         return
@@ -406,21 +89,11 @@ def render_event_calendar(selected_dates):
         else:
             next_month = datetime.date(year, month + 1, 1)
         last = next_month - datetime.timedelta(days=1)
-        days = [first + datetime.timedelta(days=i) for i in range((last - first).days + 1)]
-
-        # その月にかかっているイベントを収集（重複除去）
-        all_events = {}
-        for d in days:
-            found = _scan_event_pages_jp(d)
-            found = _filter_big_events(found)
-            for ev in found:
-                key = (ev["会場"], ev["開始日"], ev["終了日"], ev["イベント（抜粋）"])
-                if key not in all_events:
-                    all_events[key] = ev
 
+        # その月にかかっているイベント（索引を引くだけ。重複除去済み）
         # 月内での開始・終了日に切り詰めたイベントリスト
         events_in_month = []
-        for ev in all_events.values():
+        for ev in events_between(first, last, budget):
             try:
                 start = datetime.date.fromisoformat(ev["開始日"])
                 end = datetime.date.fromisoformat(ev["終了日"])
@@ -555,51 +228,6 @@ SUBDIV = {
     # "CN": None,
 }
 
-# ========= 日本の長期休み・繁忙期ユーティリティ =========
-def get_all_long_holidays(year):
-    obon_days = [datetime.date(year, 8, d) for d in range(13, 17)]
-    all_days = [datetime.date(year, 1, 1) + datetime.timedelta(days=i) for i in range(370)]
-
-    def is_holiday_like(d):
-        return jpholiday.is_holiday(d) or d.weekday() >= 5 or d in obon_days
-
-    long_holidays = set()
-    current_block = []
-    for d in all_days:
-        if is_holiday_like(d):
-            current_block.append(d)
-        else:
-            if len(current_block) >= 3:
-                long_holidays.update(current_block)
-            current_block = []
-    if len(current_block) >= 3:
-        long_holidays.update(current_block)
-
-    # 学校の長期休み
-    summer = [datetime.date(year, 7, d) for d in range(20, 32)] + [datetime.date(year, 8, d) for d in range(1, 32)]
-    winter = [datetime.date(year, 12, d) for d in range(25, 32)] + [datetime.date(year + 1, 1, d) for d in range(1, 8)]
-    spring = [datetime.date(year, 3, d) for d in range(20, 32)] + [datetime.date(year, 4, d) for d in range(1, 6)]
-    long_holidays.update(summer + winter + spring)
-    return long_holidays
-
-@lru_cache(maxsize=8)
-def _long_holiday_days_for_year(year: int):
-    return get_all_long_holidays(year)
-
-def is_long_holiday(date):
-    # 年越し対応（選択日付の年で判定）
-    return date in _long_holiday_days_for_year(date.year)
-
-def is_crowded_day(date):
-    y = date.year
-    return (
-        datetime.date(y, 7, 20) <= date <= datetime.date(y, 8, 31) or
-        datetime.date(y, 12, 25) <= date <= datetime.date(y + 1, 1, 7) or
-        datetime.date(y, 3, 20) <= date <= datetime.date(y, 4, 5) or
-        datetime.date(y, 8, 13) <= date <= datetime.date(y, 8, 16) or
-        datetime.date(y, 4, 29) <= date <= datetime.date(y, 5, 6)
-    )
-
 # ========= 世界の祝日・長期連休ユーティリティ =========
 @lru_cache(maxsize=256)
 def _country_holidays_cached(code: str, year: int, subdiv):
@@ -612,8 +240,8 @@ def _country_holidays_cached(code: str, year: int, subdiv):
     except Exception:
         return None
 
-def get_international_holidays(date):
-    """date に該当する各国の祝日名を ['中国：春节', 'アメリカ：Independence Day', ...] 形式で返す"""
+def _holiday_names(date):
+    """date に該当する各国の祝日名を [(国コード, 表示名, 祝日名), ...]（COUNTRIES 順）で返す"""
     results = []
     if pyholidays is None:
         return results
@@ -627,164 +255,183 @@ def get_international_holidays(date):
                 name_str = "・".join(map(str, names))
             else:
                 name_str = str(names)
-            results.append(f"{label}：{name_str}")
+            results.append((code, label, name_str))
     return results
 
-def is_long_holiday_in_country(date, country_code):
-    """週末 or その国の公休日 を『休日らしい日』とみなし、3日以上連続に date が含まれるなら True"""
+def get_international_holidays(date):
+    """date に該当する各国の祝日名を ['中国：春节', 'アメリカ：Independence Day', ...] 形式で返す"""
+    return [f"{label}：{name}" for _, label, name in _holiday_names(date)]
+
+def _runs_at_least(mask, k=3):
+    """bool 配列のうち「True が k 個以上連続する区間」に含まれる位置を True にする"""
+    m = np.concatenate([[False], mask, [False]]).astype(np.int8)
+    diff = np.diff(m)
+    starts = np.flatnonzero(diff == 1)
+    ends = np.flatnonzero(diff == -1)
+    keep = (ends - starts) >= k
+    delta = np.zeros(len(mask) + 1, dtype=np.int64)
+    np.add.at(delta, starts[keep], 1)
+    np.add.at(delta, ends[keep], -1)
+    return np.cumsum(delta)[:len(mask)] > 0
+
+@lru_cache(maxsize=512)
+def _long_holiday_row(country_code: str, year: int):
+    """country_code の year 年1/1〜12/31 の長期連休フラグ（1日1要素の bool 配列）"""
+    first = datetime.date(year, 1, 1)
+    n_days = (datetime.date(year + 1, 1, 1) - first).days
+    days = np.arange(np.datetime64(first), np.datetime64(first) + n_days, dtype="datetime64[D]")
+
     if country_code == "JP":
         # 日本は既存ロジック（お盆・学校休み含む）を優先
-        return is_long_holiday(date)
+        return calendar_columns(days)["長期休みフラグ"].astype(bool)
     if pyholidays is None:
-        return False
-
-    y = date.year
-    hol = _country_holidays_cached(country_code, y, SUBDIV.get(country_code))
-    holiday_set = set(hol.keys()) if hol else set()
-
-    # 年をまたぐ可能性あり：当年+前後を含めて走査
-    start = datetime.date(y, 1, 1) - datetime.timedelta(days=7)
-    days = [start + datetime.timedelta(days=i) for i in range(370 + 14)]
-
-    def is_holiday_like(d):
-        return (d in holiday_set) or (d.weekday() >= 5)
+        return np.zeros(n_days, dtype=bool)
+
+    hol = _country_holidays_cached(country_code, year, SUBDIV.get(country_code))
+    holiday_days = np.array(sorted(hol.keys()), dtype="datetime64[D]") if hol else np.array([], dtype="datetime64[D]")
+
+    # 年をまたぐ可能性あり：当年+前後を含めて走査（週末 or 公休日が3日以上連続なら長期連休）
+    start = np.datetime64(first) - 7
+    window = np.arange(start, start + 370 + 14, dtype="datetime64[D]")
+    weekend = ((window.astype(np.int64) + 3) % 7) >= 5
+    holiday_like = weekend | np.isin(window, holiday_days)
+    return _runs_at_least(holiday_like)[7:7 + n_days]
+
+@lru_cache(maxsize=32)
+def long_holiday_bitmap(year: int):
+    """COUNTRIES × year年の日数 の長期連休フラグ行列"""
+    return np.vstack([_long_holiday_row(code, year) for code in COUNTRIES])
+
+def long_holiday_matrix(dates):
+    """dates × COUNTRIES の長期連休フラグ（年ごとの行列からスライスするだけ）"""
+    out = np.zeros((len(dates), len(COUNTRIES)), dtype=bool)
+    years = np.array([d.year for d in dates], dtype=np.int64)
+    ydays = np.array([d.timetuple().tm_yday - 1 for d in dates], dtype=np.int64)
+    for y in np.unique(years):
+        sel = years == y
+        out[sel] = long_holiday_bitmap(int(y))[:, ydays[sel]].T
+    return out
+
+def build_world_holiday_table(dates):
+    """
+    日付 × 国 の祝日・長期連休をまとめた結果（サマリー表・国別詳細の両方がこれを使う）
+    返り値：[{"日付", "国コード", "国", "祝日名", "長期連休"}, ...]（日付順 → COUNTRIES 順、該当がある国だけ）
+    """
+    long_flags = long_holiday_matrix(dates)
+    country_items = list(COUNTRIES.items())
+    table = []
+    for i, d in enumerate(dates):
+        names = {code: name for code, _, name in _holiday_names(d)}
+        for k, (code, label) in enumerate(country_items):
+            long_f = bool(long_flags[i, k])
+            if code in names or long_f:
+                table.append({
+                    "日付": d,
+                    "国コード": code,
+                    "国": label,
+                    "祝日名": names.get(code, ""),
+                    "長期連休": long_f,
+                })
+    return table
 
-    block = []
-    for d in days:
-        if is_holiday_like(d):
-            block.append(d)
-        else:
-            if len(block) >= 3 and date in block:
-                return True
-            block = []
-    # 末尾ブロック
-    if len(block) >= 3 and date in block:
-        return True
-    return False
+def is_long_holiday_in_country(date, country_code):
+    """週末 or その国の公休日 を『休日らしい日』とみなし、3日以上連続に date が含まれるなら True"""
+    return bool(_long_holiday_row(country_code, date.year)[date.timetuple().tm_yday - 1])
 
 # ========= モデル・各種データ読み込み =========
-# sales_model.pkl は「モデル単体」または「{"model": ..., "feature_cols": ...}」のどちらでも対応
-sales_bundle = joblib.load("sales_model.pkl")
-sales_model = sales_bundle["model"] if isinstance(sales_bundle, dict) and "model" in sales_bundle else sales_bundle
-sales_feature_cols = sales_bundle.get("feature_cols") if isinstance(sales_bundle, dict) else None
-
-# 商品別モデルも同様に辞書形式に対応
-product_model_paths = joblib.load("product_model_paths.pkl")
-
-product_models = {}
-product_feature_cols = {}
-for name, path in product_model_paths.items():
-    if not os.path.exists(path):
-        continue
-    b = joblib.load(path)
-    key = normalize_product_name(name)
-    if isinstance(b, dict) and "model" in b:
-        product_models[key] = b["model"]
-        product_feature_cols[key] = b.get("feature_cols")
-    else:
-        product_models[key] = b
-        product_feature_cols[key] = None
+# モデルはサーバープロセスで1つのレジストリに保持し、全セッションで共有する
+# （ウィジェット操作のたびに pickle を読み直さない。ファイル更新時だけ再読込）
+@st.cache_resource
+def get_model_registry():
+    return ModelRegistry()
 
-df_menu = pd.read_csv("商品別売上_統合_統合済v1.13.csv")
-constant_items = [normalize_product_name(x) for x in df_menu[df_menu["恒常メニュー"] == 1]["商品名"].unique().tolist()]
-seasonal_items_all = [normalize_product_name(x) for x in df_menu[df_menu["シーズンメニュー"] == 1]["商品名"].unique().tolist()]
+model_registry = get_model_registry()
 
-# 強制的に「シーズン選択」に回したい商品がある場合（例：BLS）
-constant_items = [x for x in constant_items if x not in FORCE_SEASONAL_ITEMS]
-seasonal_items_all = sorted(set(seasonal_items_all) | set(FORCE_SEASONAL_ITEMS))
+# sales_model.pkl は「モデル単体」または「{"model": ..., "feature_cols": ...}」のどちらでも対応
+sales_model, sales_feature_cols = model_registry.sales()
+
+# 商品別モデルは予測で使うときに初めて読み込む（メニューにない商品は読まない）
+# 恒常メニューはほぼ毎回使うので、メニュー確定後に裏で先読みしておく
+PREFETCH_CONSTANT_MODELS = True
+# 商品別の予測を並列に回すスレッド数
+PREDICT_WORKERS = 4
+# パックに共通モデル（train_models_from_v113.py --global-model）があれば、全商品×全日付を1回で予測する
+# （共通モデルに無い商品だけ商品別モデルを使う）
+USE_GLOBAL_PRODUCT_MODEL = False
+
+# メニュー区分は学習時に書き出した menu_catalog.json から（販売履歴 CSV は読まない）
+# 強制的に「シーズン選択」に回す商品（例：BLS）や出力列の並びも menu_catalog.py で管理
+menu_catalog = load_menu_catalog()
+constant_items = menu_catalog["constant_items"]
+seasonal_items_all = menu_catalog["seasonal_items"]
+
+if PREFETCH_CONSTANT_MODELS and not USE_GLOBAL_PRODUCT_MODEL:
+    model_registry.prefetch_async(constant_items)
 
 API_KEY = st.secrets.get("OPENWEATHER_API_KEY", "")
 CITY_NAME = st.secrets.get("CITY_NAME", "Odaiba,JP")
-df_prev_weather = pd.read_csv("前年_東京羽田_天気気温.csv")
-df_prev_weather["date"] = pd.to_datetime(df_prev_weather["date"])
+# 過去の天気（*_天気気温.csv）は日付オフセットの配列で持つ（ファイルが変わったときだけ読み直す）
+weather_history = load_weather_history()
+
+def fetch_weather_forecast(date, budget=None):
+    """date の予報（都市ごとに1回だけ取得した日別表を引くだけ。API が落ちていれば即 None）"""
+    return forecast_for(date, CITY_NAME, API_KEY, budget)
+
+def make_features_batch(entries, lag7=200000, ma7=200000):
+    """全日付分の特徴量を1つの DataFrame（1日1行）にまとめて作る（カレンダー列はベクトル計算）"""
+    return build_feature_frame(
+        [e["date"] for e in entries],
+        temp_max=[e["temp_max"] for e in entries],
+        temp_min=[e["temp_min"] for e in entries],
+        weather=[e["weather"] for e in entries],
+        event=[e["event"] for e in entries],
+        lag7=lag7,
+        ma7=ma7,
+    )
 
-def fetch_weather_forecast(date):
-    url = f"https://api.openweathermap.org/data/2.5/forecast?q={CITY_NAME}&appid={API_KEY}&units=metric&lang=ja"
-    try:
-        data = requests.get(url, timeout=10).json()
-        for item in data.get("list", []):
-            dt_ = datetime.datetime.fromtimestamp(item["dt"])
-            if dt_.date() == date:
-                return item["weather"][0]["main"], item["main"]["temp_max"], item["main"]["temp_min"]
-    except Exception:
-        pass
-    return None, None, None
-
-def make_features(entry):
-    date = entry["date"]
-    weekday = date.weekday()
-    holiday = int(jpholiday.is_holiday(date))
-    month = date.month
-    season = 0 if month in [3, 4, 5] else 1 if month in [6, 7, 8] else 2 if month in [9, 10, 11] else 3
-    tokui_flag = int((date.month == 2 and date.day == 14) or (date.month == 12 and date.day == 25))
-    long_holiday_flag = int(is_long_holiday(date))
-    busy_flag = int(is_crowded_day(date))
-    weather_map = {"Clear": 0, "Clouds": 1, "Rain": 2, "晴れ": 0, "曇り": 1, "雨": 2}
-
-    df_feat = pd.DataFrame([{
-        "曜日": weekday,
-        "祝日": holiday,
-        "最高気温": entry["temp_max"],
-        "最低気温": entry["temp_min"],
-        "天気": weather_map.get(entry["weather"], 0),
-        "休日フラグ": int(weekday >= 5 or holiday == 1),
-        "特異日フラグ": tokui_flag,
-        "月": month,
-        "季節": season,
-        "イベント有無": entry["event"],
-        "長期休みの種類": 0,
-        "長期休みフラグ": long_holiday_flag,
-        "繁忙期フラグ": busy_flag,
-        "前週同曜日_売上": 200000,
-        "売上_移動平均7日": 200000,
-        "売上": 200000
-    }]).apply(pd.to_numeric, errors="coerce").fillna(0)
-    return df_feat
+def _sales_X(feats):
+    return feats[sales_feature_cols] if sales_feature_cols else feats.drop(columns=["売上", "繁忙期フラグ"])
+
+def predict_daily_sales(feats, entries):
+    """全日付の売上を1回の predict で予測し、手入力売上（>0）があればその日だけ差し替える"""
+    raw_sales = sales_model.predict(_sales_X(feats))
+    # ※ multiplier はご提示どおり 1.0 のまま
+    multiplier = np.where(feats["繁忙期フラグ"].to_numpy() == 1, 1.0, 1.0)
+    pred = (raw_sales * multiplier).astype(np.int64)
+    manual = np.array([int(e.get("manual_sales", 0) or 0) for e in entries], dtype=np.int64)
+    return np.where(manual > 0, manual, pred)
+
+def roll_forward_sales(dates, lag7, ma7):
+    """実績の先の日の売上予測（天気は平年値・イベントなし）。feature_store が1週ずつまとめて前に送るのに使う"""
+    weathers, maxs, mins = climatology_defaults(dates)
+    X = build_feature_frame(dates, temp_max=maxs, temp_min=mins, weather=weathers, event=[0] * len(dates),
+                            lag7=lag7, ma7=ma7)
+    return sales_model.predict(_sales_X(X))
 
 # ========= 出力列（ご指定の順） =========
 BASE_COLUMNS = ["日付", "曜日", "天気", "最高気温", "最低気温", "予測売上"]
-FIXED_PRODUCT_COLUMNS = [
-    "01 PBA金の房プレミアムバナナミルク",
-    "02 BA完熟バナナミルク",
-    "03 STBAつぶつぶいちごバナナミルク",
-    "04 MIXトロピカルマンゴーミックス",
-    "05 KBケールバナナ",
-    "06 ACAIアサイースムージー",
-    "07 OP果実たっぷりオレンジパイン",
-    "08 KOPつぶつぶキウイオレンジパイン",
-    "09 BOCベリーベリーオレンジココナッツ",
-    "10 MGつぶつぶマンゴーミルク",
-    "11 KIWIごろごろキウイ",
-    "12 LMNゴクゴクレモネードソーダ",
-    "13 LLS搾りたてレモンライムソーダ",
-    "14 PGS搾りたてピンクグレープフルーツソーダ",
-    "BLS_ブルーレモンソーダ",
-    "SS 東京サンセットソーダ",
-    "GY グリークヨーグルト",
-    "SU100 君島農園すいか100%生絞りジュース",
-    "MS つぶつぶメロンシェイク",
-    "PS桃スムージー",
-    "SU100 あべ農園すいか100%生絞りジュース",
-    "NS100 切りたて梨100%生搾りジュース",
-    "KPS まるごと巨峰とパインスムージー",
-    "MK100 極早生みかん果汁100%ジュース",
-    "IMO 蜜いもミルクシェイク",
-    "APK_ざくざく果実の青りんごキウイ", 
-    "【BF限定】GKB 黒ゴマきなこのバナナミルク", 
-    "AP100 赤石農園りんご生絞りジュース",
-    "STY  国産つぶつぶいちごミルクヨーグルト",
-    "MK100 愛媛みかん100%生絞りジュース",
-    "MK100 青島みかん100%生絞りジュース",
-    "STつぶつぶあまおういちごミルク",
-    "SHI100不知火100%生絞りジュース",
-    "STY あまおういちごヨーグルト",
-]
-
-FIXED_PRODUCT_COLUMNS = [normalize_product_name(x) for x in FIXED_PRODUCT_COLUMNS]
+FIXED_PRODUCT_COLUMNS = menu_catalog["column_order"]
 # ========= UI =========
 st.set_page_config(page_title="売上・商品数予測アプリ", layout="wide")
 st.title("売上・商品数予測アプリ")
 
+# この再実行で外部通信（天気・イベント）に使える持ち時間
+page_budget = TimeBudget()
+
+with st.sidebar.expander("モデル読み込み状況"):
+    st.dataframe(pd.DataFrame(model_registry.stats()), use_container_width=True)
+    rss = process_rss_bytes()
+    if rss is not None:
+        st.caption(f"プロセス常駐メモリ: {rss / 1024 / 1024:.0f} MB")
+
+with st.sidebar.expander("外部通信の状況"):
+    net_rows = metrics_rows()
+    if net_rows:
+        st.dataframe(pd.DataFrame(net_rows), use_container_width=True)
+        st.caption("前回の再実行までの累計（状態が open の接続先は冷却中のため呼び出しを省略）")
+    else:
+        st.caption("まだ外部通信はありません")
+
 selected_dates = st.date_input("予測したい日付を選択（複数可）", [], format="YYYY-MM-DD")
 
 if isinstance(selected_dates, tuple):
@@ -803,18 +450,22 @@ if selected_dates:
     if pyholidays is None:
         st.info("世界の祝日判定には 'holidays' パッケージが必要です。requirements.txt に 'holidays>=0.57' を追加後、再実行してください。")
 
+    # 日付範囲ごとに1回だけ計算してセッションに保持（サマリーと詳細は同じ結果から描画）
+    holiday_key = tuple(selected_dates)
+    if st.session_state.get("world_holiday_key") != holiday_key:
+        st.session_state["world_holiday_table"] = build_world_holiday_table(selected_dates)
+        st.session_state["world_holiday_key"] = holiday_key
+    holiday_table = st.session_state["world_holiday_table"]
+
+    # サマリー：祝日名ヒット（国名：祝日名）→ 長期連休ヒット の順に並べる
+    # 祝日名が無くても週末合体で3連休+ならヒットさせる
+    by_date = {}
+    for r in holiday_table:
+        by_date.setdefault(r["日付"], []).append(r)
     rows = []
     for d in selected_dates:
-        hits = get_international_holidays(d)  # 祝日名ヒット（国名：祝日名）
-        long_hits = []
-        # 全対象国で「長期連休」ヒットを拾う（祝日名が無くても週末合体で3連休+ならヒットさせる）
-        for code, label in COUNTRIES.items():
-            try:
-                if is_long_holiday_in_country(d, code):
-                    long_hits.append(f"{label}：長期連休")
-            except Exception:
-                continue
-
+        hits = [f"{r['国']}：{r['祝日名']}" for r in by_date.get(d, []) if r["祝日名"]]
+        long_hits = [f"{r['国']}：長期連休" for r in by_date.get(d, []) if r["長期連休"]]
         status = " / ".join(hits + long_hits) if (hits or long_hits) else "該当なし"
         rows.append({"日付": d.strftime("%Y-%m-%d"), "該当国の祝日・長期連休": status})
 
@@ -822,24 +473,12 @@ if selected_dates:
 
     # 詳細（国別）を折り畳みで
     with st.expander("国別の詳細（祝日名／長期連休ヒット）"):
-        detail_rows = []
-        for d in selected_dates:
-            # 1回だけ取得してから国別に整形（無駄な再計算を減らす）
-            names_all = get_international_holidays(d)  # ['中国：春节', 'アメリカ：Independence Day', ...]
-            by_country = {}
-            for s in names_all:
-                if "：" in s:
-                    label, name = s.split("：", 1)
-                    by_country[label] = (by_country.get(label, []) + [name])
-            for code, label in COUNTRIES.items():
-                long_f = is_long_holiday_in_country(d, code)
-                if (label in by_country) or long_f:
-                    detail_rows.append({
-                        "日付": d.strftime("%Y-%m-%d"),
-                        "国": label,
-                        "祝日名": " / ".join(by_country.get(label, [])),
-                        "長期連休": "◯" if long_f else ""
-                    })
+        detail_rows = [{
+            "日付": r["日付"].strftime("%Y-%m-%d"),
+            "国": r["国"],
+            "祝日名": r["祝日名"],
+            "長期連休": "◯" if r["長期連休"] else "",
+        } for r in holiday_table]
         if detail_rows:
             st.dataframe(pd.DataFrame(detail_rows), use_container_width=True)
         else:
@@ -852,8 +491,7 @@ if selected_dates:
     # まずは従来どおり一覧用のデータを作る
     event_rows = []
     for d in selected_dates:
-        found = _scan_event_pages_jp(d)
-        found = _filter_big_events(found)
+        found = events_on(d, page_budget)
         if found:
             for ev in found:
                 event_rows.append({
@@ -876,6 +514,10 @@ if selected_dates:
 
     df_events = pd.DataFrame(event_rows)
 
+    pending_sites = pending_event_sources()
+    if pending_sites:
+        st.caption("⏳ 取得中（時間内に応答がなかったため前回の内容で表示。再実行で反映）：" + "、".join(pending_sites))
+
     # 表示形式の切り替え（C. ボタンで切り替え）
     view_mode = st.radio(
         "イベント表示形式",
@@ -898,7 +540,7 @@ if selected_dates:
         st.caption("※ 公式サイトの一覧/カレンダーから日付表記を抽出しています。表記ゆれにより取りこぼす場合があります。")
     else:
         # 新しいカレンダー表示（選択日の「月」全体を表示）
-        render_event_calendar(selected_dates)
+        render_event_calendar(selected_dates, page_budget)
 
 # ---- 以降は既存どおり（天気プレビュー→入力→予測）----
 selected_season = []
@@ -907,20 +549,18 @@ if selected_dates:
     st.write("### 🌤️ 選択日付の天気と気温（前年データも含む）")
     weather_rows = []
     today = datetime.date.today()
+    # 前年同日（2/29 は 2/28）の天気を全日付まとめて引く
+    prev_weathers, prev_maxs, prev_mins, prev_found = weather_history.last_year(selected_dates)
 
-    for date in selected_dates:
+    for i, date in enumerate(selected_dates):
         delta = (date - today).days
         if delta <= 5:
-            weather, temp_max, temp_min = fetch_weather_forecast(date)
+            weather, temp_max, temp_min = fetch_weather_forecast(date, page_budget)
         else:
             weather, temp_max, temp_min = "", "", ""
 
-        prev_date = date.replace(year=date.year - 1)
-        prev = df_prev_weather[df_prev_weather["date"] == pd.Timestamp(prev_date)]
-        if not prev.empty:
-            prev_weather = prev.iloc[0]["weather"]
-            prev_max = prev.iloc[0]["temp_max"]
-            prev_min = prev.iloc[0]["temp_min"]
+        if prev_found[i]:
+            prev_weather, prev_max, prev_min = prev_weathers[i], prev_maxs[i], prev_mins[i]
         else:
             prev_weather, prev_max, prev_min = "", "", ""
 
@@ -937,17 +577,20 @@ if selected_dates:
     st.dataframe(pd.DataFrame(weather_rows), use_container_width=True)
 
     st.write("### 各日付の情報入力")
-    for date in selected_dates:
+    # 予報が無い日の初期値は平年値（climatology.npz。通信なし）
+    clim_weathers, clim_maxs, clim_mins = climatology_defaults(selected_dates)
+    for i, date in enumerate(selected_dates):
         date_key = date.strftime("%Y%m%d")
+        clim_index = ["晴れ", "曇り", "雨"].index(clim_weathers[i])
         with st.expander(f"{date.strftime('%Y-%m-%d')} の設定", expanded=True):
             delta = (date - today).days
             if delta <= 7:
-                weather, temp_max, temp_min = fetch_weather_forecast(date)
+                weather, temp_max, temp_min = fetch_weather_forecast(date, page_budget)
                 if weather is None:
-                    st.warning("天気取得失敗。手動で入力してください。")
-                    temp_max = st.number_input("最高気温", key=f"max_manual_{date_key}", step=1, value=20)
-                    temp_min = st.number_input("最低気温", key=f"min_manual_{date_key}", step=1, value=20)
-                    weather = st.selectbox("天気", ["晴れ", "曇り", "雨"], key=f"weather_manual_{date_key}")
+                    st.warning("天気取得失敗。平年値を初期値にしています。必要なら手動で修正してください。")
+                    temp_max = st.number_input("最高気温", key=f"max_manual_{date_key}", step=1, value=int(clim_maxs[i]))
+                    temp_min = st.number_input("最低気温", key=f"min_manual_{date_key}", step=1, value=int(clim_mins[i]))
+                    weather = st.selectbox("天気", ["晴れ", "曇り", "雨"], index=clim_index, key=f"weather_manual_{date_key}")
                 else:
                     # 英語天気→和名候補
                     candidates = ["晴れ", "曇り", "雨"]
@@ -958,9 +601,10 @@ if selected_dates:
                     temp_max = st.number_input("最高気温", key=f"max_{date_key}", value=int(temp_max) if temp_max else 20)
                     temp_min = st.number_input("最低気温", key=f"min_{date_key}", value=int(temp_min) if temp_min else 20)
             else:
-                weather = st.selectbox("天気", ["晴れ", "曇り", "雨"], key=f"weather_{date_key}")
-                temp_max = st.number_input("最高気温", key=f"max_{date_key}", value=20)
-                temp_min = st.number_input("最低気温", key=f"min_{date_key}", value=20)
+                st.caption("平年値を初期値にしています")
+                weather = st.selectbox("天気", ["晴れ", "曇り", "雨"], index=clim_index, key=f"weather_{date_key}")
+                temp_max = st.number_input("最高気温", key=f"max_{date_key}", value=int(clim_maxs[i]))
+                temp_min = st.number_input("最低気温", key=f"min_{date_key}", value=int(clim_mins[i]))
             event = st.checkbox("イベント有無", key=f"event_{date_key}")
             manual_sales = st.number_input(
                 "予想売上（手入力・0なら自動予測を使用）",
@@ -991,73 +635,50 @@ if st.button("予測を実行"):
         st.warning("日付を選択してください。")
         st.stop()
 
-    rows_for_table = []
-    all_products_used = set()  # 予測で触れた全商品（列追加のため）
+    # 前週同曜日_売上・売上_移動平均7日は実績の日別総売上から引く（実績の先は予測値を前に送る）
+    daily_totals = load_feature_store()
+    lag7, ma7 = daily_totals.lag_features([e["date"] for e in date_inputs], predict_fn=roll_forward_sales)
 
-    for entry in date_inputs:
-        date_str = entry['date'].strftime('%Y-%m-%d')
-        feat = make_features(entry)
+    # 売上予測は全日付まとめて1回で行う
+    feats = make_features_batch(date_inputs, lag7, ma7)
+    pred_sales_all = predict_daily_sales(feats, date_inputs)
+    feats["売上"] = pred_sales_all
 
-        # 売上予測（※ multiplier はご提示どおり 1.0 のまま）
-        manual_sales = int(entry.get("manual_sales", 0) or 0)
-
-        if manual_sales > 0:
-            pred_sales = manual_sales
-        else:
-            X_sales = feat[sales_feature_cols] if sales_feature_cols else feat.drop(columns=["売上", "繁忙期フラグ"])
-            raw_sales = sales_model.predict(X_sales)[0]
-            multiplier = 1.0 if feat.at[0, "繁忙期フラグ"] == 1 else 1.0
-            pred_sales = int(raw_sales * multiplier)
-
-        feat["売上"] = pred_sales
-
-        # 商品数量予測
-        qty_dict = {}
-        for item in (constant_items + selected_season):
-            item = normalize_product_name(item)
-            if item in product_models:
-                cols = product_feature_cols.get(item)
-                X_prod = feat[cols] if cols else feat.drop(columns=["繁忙期フラグ"])
-                qty = int(product_models[item].predict(X_prod)[0])
-                qty_dict[item] = qty
-            # モデルなしは未出力にしてOK（列は後で作るが値は空）
-            all_products_used.add(item)
-
-        # 行データ（基本項目）
-        weekday_jp = ["月", "火", "水", "木", "金", "土", "日"][entry["date"].weekday()]
-        row = {
-            "日付": date_str,
-            "曜日": weekday_jp,
-            "天気": entry["weather"],
-            "最高気温": int(entry["temp_max"]) if entry["temp_max"] not in ["", None] else "",
-            "最低気温": int(entry["temp_min"]) if entry["temp_min"] not in ["", None] else "",
-            "予測売上": pred_sales,
-        }
-
-        # 先に固定列（指定順）を埋める
-        for col in FIXED_PRODUCT_COLUMNS:
-            row[col] = qty_dict.get(col, "")
-
-        # 後ろに“その他商品”を並べる（PS桃スムージーの後）
-        others = sorted(list(all_products_used - set(FIXED_PRODUCT_COLUMNS)))
-        for prod in others:
-            row[prod] = qty_dict.get(prod, "")
-
-        rows_for_table.append(row)
+    # 商品数量予測：商品ごとに全日付を1回で予測（日付 × 商品 の配列）
+    items = list(dict.fromkeys(normalize_product_name(x) for x in (constant_items + selected_season)))
+    qty_matrix = model_registry.predict_products(items, feats, max_workers=PREDICT_WORKERS,
+                                                 use_global=USE_GLOBAL_PRODUCT_MODEL)
+    item_index = {item: j for j, item in enumerate(items)}
+    all_products_used = set(items)  # 予測で触れた全商品（列追加のため）
 
     # 列構成：基本 → 固定商品 → その他商品（PS桃スムージーの後）
     all_other_products = sorted(list((all_products_used - set(FIXED_PRODUCT_COLUMNS))))
     final_columns = BASE_COLUMNS + FIXED_PRODUCT_COLUMNS + all_other_products
 
-    df_out = pd.DataFrame(rows_for_table)
-    # 足りない列は作って順序を揃える
-    for c in final_columns:
-        if c not in df_out.columns:
-            df_out[c] = ""
-    df_out = df_out[final_columns]
+    # 行データ（基本項目）
+    weekday_jp = ["月", "火", "水", "木", "金", "土", "日"]
+    out_cols = {
+        "日付": [e["date"].strftime('%Y-%m-%d') for e in date_inputs],
+        "曜日": [weekday_jp[e["date"].weekday()] for e in date_inputs],
+        "天気": [e["weather"] for e in date_inputs],
+        "最高気温": [int(e["temp_max"]) if e["temp_max"] not in ["", None] else "" for e in date_inputs],
+        "最低気温": [int(e["temp_min"]) if e["temp_min"] not in ["", None] else "" for e in date_inputs],
+        "予測売上": pred_sales_all,
+    }
+    # 商品列：モデルなしの商品・未選択の固定列は空欄
+    for col in final_columns[len(BASE_COLUMNS):]:
+        j = item_index.get(col)
+        if j is None or np.isnan(qty_matrix[:, j]).any():
+            out_cols[col] = [""] * len(date_inputs)
+        else:
+            out_cols[col] = qty_matrix[:, j].astype(np.int64)
+
+    df_out = pd.DataFrame(out_cols, columns=final_columns)
 
     st.write("## 📋 コピペ用の結果表（このままExcelへ貼り付け可）")
     st.dataframe(df_out, use_container_width=True)
+    if daily_totals.last is not None:
+        st.caption(f"前週同曜日_売上・移動平均は {np.datetime64(daily_totals.last, 'D')} までの実績から計算しています")
 
     st.write("#### タブ区切りテキスト（Ctrl/Cmd + A → コピー → Excelに貼り付け）")
     tsv = df_out.to_csv(sep="\t", index=False)
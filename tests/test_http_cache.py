@@ -0,0 +1,120 @@
+# tests/test_http_cache.py
+# http_cache.DiskHTTPCache を localhost の HTTP サーバー相手に確かめる
+# ・TTL 内はリクエストを送らない
+# ・TTL 切れで 304 なら本文を使い回す / 200 なら差し替える
+# ・サーバーが落ちていたら古い本文を返す
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_cache import DiskHTTPCache
+from resilience import TimeBudget
+
+
+class _Page:
+    """サーバーが返すページ（本文・ETag）と受けたリクエストの記録"""
+
+    def __init__(self, body: str, etag: str):
+        self.body = body
+        self.etag = etag
+        self.requests = []   # 受けたリクエストの If-None-Match
+
+
+def _make_handler(page: _Page):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            inm = self.headers.get("If-None-Match")
+            page.requests.append(inm)
+            if inm is not None and inm == page.etag:
+                self.send_response(304)
+                self.send_header("ETag", page.etag)
+                self.end_headers()
+                return
+            data = page.body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", page.etag)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def server():
+    page = _Page("<html>v1</html>", '"v1"')
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(page))
+    th = threading.Thread(target=httpd.serve_forever, daemon=True)
+    th.start()
+    url = f"http://127.0.0.1:{httpd.server_address[1]}/events"
+    yield httpd, page, url
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _expire(cache: DiskHTTPCache, url: str):
+    """保存済みエントリを TTL 切れにする"""
+    ent = cache.read(url)
+    ent["fetched_at"] -= cache.ttl + 1
+    cache._write(url, ent)
+
+
+def test_fresh_entry_is_served_without_request(tmp_path, server):
+    _, page, url = server
+    cache = DiskHTTPCache(str(tmp_path), ttl=60, timeout=2)
+    assert cache.get(url) == "<html>v1</html>"
+    assert len(page.requests) == 1
+
+    page.body = "<html>v2</html>"
+    assert cache.get(url) == "<html>v1</html>"
+    # 別インスタンス（再起動後）でもディスクから返す
+    assert DiskHTTPCache(str(tmp_path), ttl=60, timeout=2).get(url) == "<html>v1</html>"
+    assert len(page.requests) == 1
+
+
+def test_not_modified_reuses_cached_body(tmp_path, server):
+    _, page, url = server
+    cache = DiskHTTPCache(str(tmp_path), ttl=60, timeout=2)
+    cache.get(url)
+    _expire(cache, url)
+
+    assert cache.get(url) == "<html>v1</html>"
+    assert page.requests == [None, '"v1"']
+    # 304 で取得時刻が更新され、次は TTL 内として扱われる
+    assert cache.is_fresh(cache.read(url))
+    cache.get(url)
+    assert len(page.requests) == 2
+
+
+def test_changed_page_replaces_cached_body(tmp_path, server):
+    _, page, url = server
+    cache = DiskHTTPCache(str(tmp_path), ttl=60, timeout=2)
+    cache.get(url)
+    _expire(cache, url)
+    page.body, page.etag = "<html>v2</html>", '"v2"'
+
+    assert cache.get(url) == "<html>v2</html>"
+    assert page.requests == [None, '"v1"']
+    ent = DiskHTTPCache(str(tmp_path), ttl=60).read(url)
+    assert ent["body"] == "<html>v2</html>"
+    assert ent["etag"] == '"v2"'
+
+
+def test_server_down_returns_stale_body(tmp_path, server):
+    httpd, page, url = server
+    cache = DiskHTTPCache(str(tmp_path), ttl=60, timeout=2)
+    cache.get(url)
+    _expire(cache, url)
+    httpd.shutdown()
+    httpd.server_close()
+
+    assert cache.get(url, budget=TimeBudget(2.0)) == "<html>v1</html>"
+    assert len(page.requests) == 1
+    # 取れなかったので古いまま（TTL 切れのまま次回また取りに行く）
+    assert not cache.is_fresh(cache.read(url))
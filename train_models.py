@@ -5,6 +5,9 @@ import joblib
 from sklearn.model_selection import train_test_split
 from xgboost import XGBRegressor
 
+from calendar_features import add_calendar_columns
+from history_store import load_history
+
 # 読み込むCSVファイル名（同じディレクトリに置くこと）
 DATA_PATH = "商品別売上_統合_統合済v1.13.csv"
 
@@ -21,7 +24,9 @@ FEATURE_COLS = [
 TARGET_COL = "商品数"
 
 def main():
-    df = pd.read_csv(DATA_PATH)
+    df = load_history(DATA_PATH)
+    # 曜日・祝日・季節・長期休みなどはカレンダー表から引き直す（アプリの予測時と同じ定義）
+    df = add_calendar_columns(df, "日付")
     product_model_paths = {}
 
     for product_name, group in df.groupby("商品名"):
@@ -1,41 +1,134 @@
 # train_models_from_v113.py
 # v1.13 CSVから
-# 1) 日別総売上モデル sales_model.pkl
-# 2) 商品別数量モデル product_models/*.pkl と product_model_paths.pkl
-# を作る
+# 1) 日別総売上モデル
+# 2) 商品別数量モデル
+# を作り、まとめて model_pack.bin（manifest + XGBoostネイティブ形式のブースター）に書き出す
+# アプリ用のメニュー一覧 menu_catalog.json も同時に書き出す
+# 旧形式（sales_model.pkl / product_models/*.pkl / product_model_paths.pkl）は WRITE_LEGACY_PICKLES で併用可
+#
+# 商品モデルはプロセスを分けて並列に学習できる
+#   python train_models_from_v113.py --workers 4              … 商品ごとに4プロセスへ配る
+#   python train_models_from_v113.py --workers 8 --split folds … 商品×fold 単位で配る（商品数が少ないとき向け）
+#   python train_models_from_v113.py --global-model          … 全商品で1つの共通モデルもパックに入れる
+# 各プロセスの XGBoost スレッド数は --nthread（省略時は CPU数 / workers）に抑える
+#
+# 学習の仕方（--mode）
+#   refit     … 各 fold で検証MAEの早期打ち切り（EARLY_STOPPING_ROUNDS）で木の本数を決め、
+#                その中央値の本数で全期間を1回学習し直したモデルを出す（既定）
+#   best_fold … 各 fold で 800 本すべて学習し、検証MAEが最良の fold のモデルをそのまま出す（従来）
+#
+# 特徴量のビン分け（hist の分位点）は学習表（売上・各商品・共通モデル）ごとに1回だけ
+# ・表全体から QuantileDMatrix を1つ作って分位点を求め（quantized_reference）、各 fold の学習/検証と
+#   全期間での学習し直しのデータはそれを ref にして作る（fold ごとに分位点を求め直さない）
+# ・ただし --split folds では使い回せない：QuantileDMatrix はプロセス間で受け渡せないので、
+#   fold・学習し直しのタスクごとにそのプロセスで商品の表全体から分位点を求め直す（1商品あたり n_splits+1 回）
+#   分位点（カット値）だけ送って作り直しても、商品の表は小さく手間は変わらない（どちらも1回 2ms 程度）ので、
+#   この節約が効くのは逐次と --split products のときだけ
+#
+# 共通モデル（--global-model）
+# ・全商品の行を1つの表にし、商品（正規化した商品名）とカテゴリーを XGBoost のカテゴリ変数にして1つ学習する
+# ・行が少ない商品も他の商品と一緒に学習できる（商品別モデルの MIN_PRODUCT_ROWS 未満の商品も入れる）
+# ・パックの "global" に入れる。アプリは ModelRegistry.predict_products(use_global=True) で使う
+#
+# 差分だけの学習し直し
+# ・モデルごとに「学習条件（特徴量列・ハイパーパラメータ・学習の仕方・TRAINER_VERSION）」と
+#   「学習データ」のハッシュを manifest に入れておく（config_hash / data_hash / fingerprint）
+# ・次の実行で fingerprint が前回のパックと同じモデルは学習せず、ブースターをそのまま引き継ぐ
+# ・--warm-start を付けると、前回の行の後ろに日が足されただけのモデルは、前回のブースターに
+#   追記後の全期間で WARM_START_ROUNDS 本だけ木を足す（MAX_WARM_STARTS 回続いたら学習し直し）
+# ・--full で前回のパックを使わず全部学習し直す
+# 学習のコードを変えたら TRAINER_VERSION を上げること
 
 import os
 import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
 import joblib
 import numpy as np
 import pandas as pd
 
 from sklearn.model_selection import TimeSeriesSplit
 from sklearn.metrics import mean_absolute_error
+import xgboost as xgb
 from xgboost import XGBRegressor
 
+from model_store import (
+    GLOBAL_CATEGORY_COL, GLOBAL_PRODUCT_COL, MODEL_PACK_PATH, ModelPack, booster_to_bytes,
+    normalize_product_name, regressor_from_bytes, write_model_pack,
+)
+from calendar_features import add_calendar_columns
+from history_store import load_history
+from menu_catalog import MENU_CATALOG_PATH, build_menu_catalog_from_csv, write_menu_catalog
+
 
 CSV_PATH = "商品別売上_統合_統合済v1.13.csv"
 
+OUT_MODEL_PACK = MODEL_PACK_PATH
+OUT_MENU_CATALOG = MENU_CATALOG_PATH
 OUT_SALES_MODEL = "sales_model.pkl"
 OUT_PRODUCT_DIR = "product_models"
 OUT_PRODUCT_PATHS = "product_model_paths.pkl"
 
+# 旧アプリ（v19 など）向けに pickle も出したい場合だけ True
+WRITE_LEGACY_PICKLES = False
+
 RANDOM_STATE = 42
+N_SPLITS = 5
+
+# ざっくり強めの汎用設定（過学習しにくい寄り）
+XGB_PARAMS = dict(
+    n_estimators=800,
+    learning_rate=0.03,
+    max_depth=5,
+    subsample=0.9,
+    colsample_bytree=0.9,
+    reg_lambda=1.0,
+    reg_alpha=0.0,
+    random_state=RANDOM_STATE,
+    objective="reg:squarederror",
+    tree_method="hist",
+)
+
+# 共通モデル：商品・カテゴリーをカテゴリ変数として扱う
+GLOBAL_XGB_PARAMS = dict(XGB_PARAMS, enable_categorical=True)
+# 商品別モデルを作る最低行数（これ未満は学習が不安定）
+MIN_PRODUCT_ROWS = 15
+
+# 商品モデルの並列学習（1 なら従来どおりこのプロセスで順番に）
+DEFAULT_WORKERS = 1
+
+TRAIN_MODES = ["refit", "best_fold"]
+DEFAULT_TRAIN_MODE = "refit"
+EARLY_STOPPING_ROUNDS = 50
+
+# 差分学習
+TRAINER_VERSION = 2
+WARM_START_ROUNDS = 20
+MAX_WARM_STARTS = 7
 
 
 def load_data(csv_path: str) -> pd.DataFrame:
-    df = pd.read_csv(csv_path)
+    # CSV は history_store の Parquet（型変換済み・日付順）経由で読む
+    df = load_history(csv_path)
 
     # 日付
     df["日付"] = pd.to_datetime(df["日付"], errors="coerce")
-    df = df.dropna(subset=["日付"]).sort_values("日付").reset_index(drop=True)
+    # 同じ日の行は元の並びのまま（安定ソート。差分学習の「前回の行の続きか」の判定に効く）
+    df = df.dropna(subset=["日付"]).sort_values("日付", kind="mergesort").reset_index(drop=True)
+
+    # 曜日・祝日・季節・長期休みなどはカレンダー表から引き直す（アプリの予測時と同じ定義）
+    df = add_calendar_columns(df, "日付")
 
     # 天気を数値へ（既に数値ならそのまま）
     # v1.13は「晴れ/曇り/雨」想定。もし英語が混ざっても対応。
     weather_map = {"晴れ": 0, "曇り": 1, "雨": 2, "Clear": 0, "Clouds": 1, "Rain": 2}
-    if df["天気"].dtype == "object":
-        df["天気"] = df["天気"].map(weather_map).fillna(0)
+    # （category / str / object のどれで来ても文字列なら変換する）
+    if not pd.api.types.is_numeric_dtype(df["天気"]):
+        df["天気"] = df["天気"].astype(object).map(weather_map).fillna(0)
 
     # 数値化（壊れた値はNaN→0）
     num_cols = [
@@ -84,53 +177,303 @@ def make_daily_sales_table(df: pd.DataFrame) -> pd.DataFrame:
     return daily
 
 
-def train_xgb_regressor_time_series(X: pd.DataFrame, y: pd.Series, n_splits: int = 5) -> XGBRegressor:
-    # ざっくり強めの汎用設定（過学習しにくい寄り）
-    model = XGBRegressor(
-        n_estimators=800,
-        learning_rate=0.03,
-        max_depth=5,
-        subsample=0.9,
-        colsample_bytree=0.9,
-        reg_lambda=1.0,
-        reg_alpha=0.0,
-        random_state=RANDOM_STATE,
-        objective="reg:squarederror",
-        tree_method="hist",
+def frame_hash(X: pd.DataFrame, y: pd.Series) -> str:
+    """学習データ（説明変数＋目的変数）の内容ハッシュ"""
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    h.update(pd.util.hash_pandas_object(y, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def training_config_hash(feature_cols, mode: str, n_splits: int = N_SPLITS, params=XGB_PARAMS) -> str:
+    """学習条件（特徴量列・ハイパーパラメータ・学習の仕方・コードの版）のハッシュ"""
+    config = {
+        "feature_cols": list(feature_cols),
+        "params": params,
+        "mode": mode,
+        "n_splits": n_splits,
+        "early_stopping_rounds": EARLY_STOPPING_ROUNDS,
+        "trainer_version": TRAINER_VERSION,
+        "xgboost": xgb.__version__,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def plan_training(old, config_hash: str, X: pd.DataFrame, y: pd.Series, warm_start: bool = False):
+    """
+    前回のパックのエントリ old と比べて、("skip" | "warm" | "train", manifest に入れるハッシュ) を返す
+    skip … 学習条件もデータも同じ
+    warm … 学習条件が同じで、前回の行の後ろに行が足されただけ（warm_start のときだけ）
+    """
+    data_hash = frame_hash(X, y)
+    meta = {
+        "config_hash": config_hash,
+        "data_hash": data_hash,
+        "fingerprint": hashlib.sha256((config_hash + data_hash).encode("utf-8")).hexdigest(),
+    }
+    if old is None:
+        return "train", meta
+    if old.get("fingerprint") == meta["fingerprint"]:
+        return "skip", meta
+    n_old = int(old.get("rows") or 0)
+    if (warm_start and old.get("config_hash") == config_hash and 0 < n_old < len(X)
+            and old.get("warm_starts", 0) < MAX_WARM_STARTS
+            and frame_hash(X.iloc[:n_old], y.iloc[:n_old]) == old.get("data_hash")):
+        return "warm", meta
+    return "train", meta
+
+
+def warm_start_regressor(raw, X, y, n_rounds: int = WARM_START_ROUNDS, n_jobs=None,
+                         params=XGB_PARAMS) -> XGBRegressor:
+    """前回のブースター（UBJSON）に、追記後の全期間で n_rounds 本だけ木を足す"""
+    base = regressor_from_bytes(raw).get_booster()
+    m = XGBRegressor(**dict(params, n_estimators=n_rounds, n_jobs=n_jobs))
+    m.fit(_as_train_matrix(X), np.asarray(y), xgb_model=base, verbose=False)
+    return m
+
+
+def open_previous_pack(path: str):
+    """前回のパック（無い/読めなければ None）"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return ModelPack(path)
+    except Exception as e:
+        print(f"[WARN] 前回のモデルパックを読めないので全部学習し直します: {e}")
+        return None
+
+
+def make_global_table(df2: pd.DataFrame, feature_cols, qty_col: str):
+    """
+    共通モデルの学習データ：全商品の行を日付順に並べ、商品（正規化名）・カテゴリーのカテゴリ列を足す
+    (X, y, 商品 → カテゴリー) を返す
+    """
+    g = df2.dropna(subset=[qty_col, "売上"]).sort_values("日付", kind="mergesort")
+    keys = g["商品名"].astype(str).map(normalize_product_name)
+    cats = g["カテゴリー"].astype(object).fillna("").astype(str)
+    # 同じ商品でカテゴリーが変わっていたら最後の日のものを使う
+    product_categories = dict(zip(keys, cats))
+    X = g[list(feature_cols)].reset_index(drop=True)
+    X[GLOBAL_PRODUCT_COL] = pd.Categorical(keys.to_numpy(), categories=sorted(product_categories))
+    X[GLOBAL_CATEGORY_COL] = pd.Categorical(cats.to_numpy(), categories=sorted(set(cats)))
+    return X, g[qty_col].reset_index(drop=True), product_categories
+
+
+def _as_train_matrix(X):
+    """学習に渡す形：カテゴリ列がある表は DataFrame のまま、それ以外は NumPy 配列"""
+    if isinstance(X, pd.DataFrame) and any(isinstance(t, pd.CategoricalDtype) for t in X.dtypes):
+        return X
+    return np.asarray(X)
+
+
+def _take(X, idx):
+    return X.iloc[idx] if isinstance(X, pd.DataFrame) else X[idx]
+
+
+def quantized_reference(X, params=XGB_PARAMS) -> xgb.QuantileDMatrix:
+    """学習表全体の分位点（ビンの境目）を1回だけ求めた QuantileDMatrix（各 fold・学習し直しの ref に使う）"""
+    return xgb.QuantileDMatrix(_as_train_matrix(X), max_bin=params.get("max_bin", 256),
+                               enable_categorical=params.get("enable_categorical", False))
+
+
+def _quantized(X, y, ref, params=XGB_PARAMS) -> xgb.QuantileDMatrix:
+    """ref の分位点でビン分けした学習/検証データ"""
+    return xgb.QuantileDMatrix(X, y, ref=ref, enable_categorical=params.get("enable_categorical", False))
+
+
+def _booster_params(params, n_jobs=None, **extra) -> dict:
+    """XGBRegressor の引数 → xgb.train のパラメータ"""
+    bp = {k: v for k, v in XGBRegressor(**params).get_xgb_params().items() if v is not None}
+    if n_jobs:
+        bp["n_jobs"] = n_jobs
+    bp.update(extra)
+    return bp
+
+
+def _to_regressor(booster) -> XGBRegressor:
+    return regressor_from_bytes(booster_to_bytes(booster))
+
+
+def _fit_fold(X_np, y_np, tr, va, n_jobs=None, early_stopping: bool = False, params=XGB_PARAMS, ref=None):
+    """1つの fold を学習して (ブースター, 検証MAE, 使う木の本数) を返す"""
+    if ref is None:
+        ref = quantized_reference(X_np, params)
+    dtrain = _quantized(_take(X_np, tr), y_np[tr], ref, params)
+    # 検証側は dtrain を ref にする（xgb.train の決まり。分位点は dtrain と同じ ref のもの）
+    dvalid = _quantized(_take(X_np, va), y_np[va], dtrain, params)
+    booster = xgb.train(
+        _booster_params(params, n_jobs, **({"eval_metric": "mae"} if early_stopping else {})),
+        dtrain,
+        num_boost_round=params["n_estimators"],
+        evals=[(dvalid, "validation_0")],
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS if early_stopping else None,
+        verbose_eval=False,
     )
+    rounds = booster.best_iteration + 1 if early_stopping else params["n_estimators"]
+    pred = booster.predict(dvalid, iteration_range=(0, rounds))
+    return booster, mean_absolute_error(y_np[va], pred), rounds
 
-    # 時系列CVで早期打ち切りしながら学習
-    tscv = TimeSeriesSplit(n_splits=n_splits)
-    best_model = None
-    best_mae = float("inf")
-
-    X_np = X.to_numpy()
-    y_np = y.to_numpy()
-
-    for fold, (tr, va) in enumerate(tscv.split(X_np), start=1):
-        X_tr, y_tr = X_np[tr], y_np[tr]
-        X_va, y_va = X_np[va], y_np[va]
-
-        m = XGBRegressor(**model.get_params())
-        m.fit(
-            X_tr, y_tr,
-            eval_set=[(X_va, y_va)],
-            verbose=False
-        )
-
-        pred = m.predict(X_va)
-        mae = mean_absolute_error(y_va, pred)
-        # print(f"[fold {fold}] MAE={mae:.2f}")
 
+def _pick_best(results):
+    """[(fold, モデル, MAE), ...] から MAE 最小（同じなら先の fold）のモデル"""
+    best_model, best_mae = None, float("inf")
+    for _, m, mae in sorted(results, key=lambda r: r[0]):
         if mae < best_mae:
             best_mae = mae
             best_model = m
-
-    # 最良モデルを返す
     return best_model
 
 
-def main():
+def refit_rounds(rounds) -> int:
+    """各 fold の最良の木の本数の中央値"""
+    return max(1, int(round(float(np.median(rounds)))))
+
+
+def _refit(X_np, y_np, n_rounds: int, n_jobs=None, params=XGB_PARAMS, ref=None) -> XGBRegressor:
+    """全期間を n_rounds 本で学習し直す"""
+    if ref is None:
+        ref = quantized_reference(X_np, params)
+    booster = xgb.train(_booster_params(params, n_jobs), _quantized(X_np, y_np, ref, params),
+                        num_boost_round=n_rounds, verbose_eval=False)
+    return _to_regressor(booster)
+
+
+def train_xgb_regressor_time_series(X, y, n_splits: int = N_SPLITS, n_jobs=None,
+                                    mode: str = DEFAULT_TRAIN_MODE, params=XGB_PARAMS, ref=None) -> XGBRegressor:
+    # 時系列CVで各 fold を学習し、mode に応じて最終モデルを作る
+    # ビン分けの分位点は ref（無ければこの表全体から1回だけ求める）を全 fold で使い回す
+    tscv = TimeSeriesSplit(n_splits=n_splits)
+    X_np = _as_train_matrix(X)
+    y_np = np.asarray(y)
+    early = mode == "refit"
+    if ref is None:
+        ref = quantized_reference(X_np, params)
+
+    results = []
+    for fold, (tr, va) in enumerate(tscv.split(X_np), start=1):
+        m, mae, rounds = _fit_fold(X_np, y_np, tr, va, n_jobs, early_stopping=early, params=params, ref=ref)
+        # print(f"[fold {fold}] MAE={mae:.2f} rounds={rounds}")
+        results.append((fold, m, mae, rounds))
+
+    if early:
+        return _refit(X_np, y_np, refit_rounds([r[3] for r in results]), n_jobs, params, ref)
+    # 最良モデルを返す
+    return _to_regressor(_pick_best([r[:3] for r in results]))
+
+
+def _train_product_task(name, X_np, y_np, n_splits, n_jobs, mode=DEFAULT_TRAIN_MODE):
+    t0 = time.perf_counter()
+    m = train_xgb_regressor_time_series(X_np, y_np, n_splits, n_jobs, mode)
+    return name, m, time.perf_counter() - t0
+
+
+def _train_fold_task(name, fold, X_np, y_np, tr, va, n_jobs, mode=DEFAULT_TRAIN_MODE):
+    t0 = time.perf_counter()
+    early = mode == "refit"
+    # 分位点は商品の表全体から（順番に学習したときと同じビンになる）
+    # ref は別プロセスから受け取れないので、タスクごとにここで求め直す（ファイル冒頭の説明を参照）
+    m, mae, rounds = _fit_fold(X_np, y_np, tr, va, n_jobs, early_stopping=early)
+    # refit では fold のモデル自体は使わないので送り返さない
+    return name, fold, (None if early else m), mae, rounds, time.perf_counter() - t0
+
+
+def _refit_task(name, X_np, y_np, n_rounds, n_jobs):
+    t0 = time.perf_counter()
+    m = _refit(X_np, y_np, n_rounds, n_jobs)
+    return name, m, time.perf_counter() - t0
+
+
+def train_products(datasets: dict, workers: int = DEFAULT_WORKERS, nthread=None,
+                   split: str = "products", n_splits: int = N_SPLITS,
+                   mode: str = DEFAULT_TRAIN_MODE) -> dict:
+    """
+    商品名 → (X, y) をまとめて学習し、商品名 → (モデル, 学習秒数) を返す
+    workers > 1 ならプロセスプールで並列（split="folds" なら 商品×fold 単位で配り、
+    refit は fold が揃った商品から順に投げる）
+    """
+    total = len(datasets)
+    out = {}
+
+    def _log(name, sec):
+        print(f"[{len(out)}/{total}] {name}: {sec:.1f}s", flush=True)
+
+    if workers <= 1:
+        for name, (X, y) in datasets.items():
+            _, m, sec = _train_product_task(name, np.asarray(X), np.asarray(y), n_splits, nthread, mode)
+            out[name] = (m, sec)
+            _log(name, sec)
+        return out
+
+    # fork だと親で初期化済みの OpenMP を引き継いで固まることがあるので spawn
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as ex:
+        if split == "folds":
+            arrays = {name: (np.asarray(X), np.asarray(y)) for name, (X, y) in datasets.items()}
+            folds = {name: [] for name in datasets}
+            pending = set()
+            for name, (X_np, y_np) in arrays.items():
+                for fold, (tr, va) in enumerate(TimeSeriesSplit(n_splits=n_splits).split(X_np), start=1):
+                    pending.add(ex.submit(_train_fold_task, name, fold, X_np, y_np, tr, va, nthread, mode))
+            fold_sec = {}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    res = fut.result()
+                    if len(res) == 3:
+                        # 全期間での学習し直しが終わった
+                        name, m, sec = res
+                        out[name] = (m, fold_sec[name] + sec)
+                        _log(name, out[name][1])
+                        continue
+                    name, fold, m, mae, rounds, sec = res
+                    folds[name].append((fold, m, mae, rounds, sec))
+                    if len(folds[name]) < n_splits:
+                        continue
+                    fold_sec[name] = sum(r[4] for r in folds[name])
+                    if mode == "refit":
+                        X_np, y_np = arrays[name]
+                        n_rounds = refit_rounds([r[3] for r in folds[name]])
+                        pending.add(ex.submit(_refit_task, name, X_np, y_np, n_rounds, nthread))
+                    else:
+                        out[name] = (_to_regressor(_pick_best([r[:3] for r in folds[name]])), fold_sec[name])
+                        _log(name, fold_sec[name])
+        else:
+            futs = [ex.submit(_train_product_task, name, np.asarray(X), np.asarray(y), n_splits, nthread, mode)
+                    for name, (X, y) in datasets.items()]
+            for fut in as_completed(futs):
+                name, m, sec = fut.result()
+                out[name] = (m, sec)
+                _log(name, sec)
+    return out
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="v1.13 CSV から売上モデル・商品別モデルを学習して model_pack.bin に書き出す")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                    help="商品モデルを学習するプロセス数（0 なら CPU 数）")
+    ap.add_argument("--nthread", type=int, default=None,
+                    help="プロセスごとの XGBoost スレッド数（省略時は CPU数 / workers）")
+    ap.add_argument("--split", choices=["products", "folds"], default="products",
+                    help="並列化の単位（商品ごと / 商品×fold ごと）")
+    ap.add_argument("--mode", choices=TRAIN_MODES, default=DEFAULT_TRAIN_MODE,
+                    help="refit: 早期打ち切り＋全期間で学習し直し / best_fold: 従来どおり最良 fold のモデル")
+    ap.add_argument("--warm-start", action="store_true",
+                    help="行が足されただけのモデルは前回のブースターに木を足す")
+    ap.add_argument("--full", action="store_true",
+                    help="前回のパックを使わず全部学習し直す")
+    ap.add_argument("--global-model", action="store_true",
+                    help="全商品で1つの共通モデル（商品・カテゴリーをカテゴリ変数に）も学習する")
+    args = ap.parse_args(argv)
+    cpus = os.cpu_count() or 1
+    if args.workers <= 0:
+        args.workers = cpus
+    if args.nthread is None and args.workers > 1:
+        args.nthread = max(1, cpus // args.workers)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
     if not os.path.exists(CSV_PATH):
         raise FileNotFoundError(f"CSVが見つかりません: {CSV_PATH}")
 
@@ -148,11 +491,42 @@ def main():
     X_sales = daily[sales_feature_cols]
     y_sales = daily["日別総売上"]
 
-    sales_model = train_xgb_regressor_time_series(X_sales, y_sales, n_splits=5)
-    joblib.dump({"model": sales_model, "feature_cols": sales_feature_cols}, OUT_SALES_MODEL)
+    prev = None if args.full else open_previous_pack(OUT_MODEL_PACK)
+    prev_sales = prev.manifest.get("sales") if prev is not None else None
+    # 表記ゆれで key が重なる商品もあるので、前回のエントリは商品名そのもので引く
+    prev_products = {e["name"]: e for e in prev.manifest.get("products", [])} if prev is not None else {}
+    plans = {"train": 0, "warm": 0, "skip": 0}
+
+    def _build(old, plan, meta, X, y, train_fn=None, params=XGB_PARAMS):
+        """plan_training の結果に沿って (manifest 用エントリ, モデル or None) を作る"""
+        plans[plan] += 1
+        if plan == "skip":
+            # ブースターは前回のパックのバイト列をそのまま使う
+            keep = {k: v for k, v in old.items() if k not in ("offset", "length", "format")}
+            return dict(keep, raw=prev.raw(old)), None
+        if plan == "warm":
+            m = warm_start_regressor(prev.raw(old), X, y, n_jobs=args.nthread, params=params)
+            warm = old.get("warm_starts", 0) + 1
+        else:
+            m = train_fn()
+            warm = 0
+        return dict(meta, model=m, rows=len(X), warm_starts=warm,
+                    trees=m.get_booster().num_boosted_rounds()), m
+
+    sales_config = training_config_hash(sales_feature_cols, args.mode)
+    sales_entry, sales_model = _build(
+        prev_sales, *plan_training(prev_sales, sales_config, X_sales, y_sales, args.warm_start), X_sales, y_sales,
+        lambda: train_xgb_regressor_time_series(X_sales, y_sales, n_splits=N_SPLITS, mode=args.mode),
+    )
+    sales_entry.update({"name": "売上モデル", "feature_cols": sales_feature_cols})
+    if WRITE_LEGACY_PICKLES:
+        if sales_model is None:
+            sales_model = regressor_from_bytes(sales_entry["raw"])
+        joblib.dump({"model": sales_model, "feature_cols": sales_feature_cols}, OUT_SALES_MODEL)
 
     # ---------- 2) 商品別数量モデル ----------
-    os.makedirs(OUT_PRODUCT_DIR, exist_ok=True)
+    if WRITE_LEGACY_PICKLES:
+        os.makedirs(OUT_PRODUCT_DIR, exist_ok=True)
 
     # 商品数列の決定（優先：商品数 → なければ販売商品数）
     if "商品数" in df.columns and df["商品数"].notna().any():
@@ -166,46 +540,130 @@ def main():
 
     product_feature_cols = sales_feature_cols + ["売上"]
 
+    product_entries = []
     product_paths = {}
     summary = []
 
+    datasets = {}
     for product_name, g in df2.groupby("商品名"):
-        g = g.sort_values("日付").dropna(subset=[qty_col, "売上"])
+        g = g.sort_values("日付", kind="mergesort").dropna(subset=[qty_col, "売上"])
 
         # データが少なすぎる商品はスキップ（学習が不安定）
-        if len(g) < 15:
+        if len(g) < MIN_PRODUCT_ROWS:
             continue
-
-        X_p = g[product_feature_cols]
-        y_p = g[qty_col]
-
-        m = train_xgb_regressor_time_series(X_p, y_p, n_splits=5)
-
-        safe_name = "".join(ch if ch.isalnum() else "_" for ch in str(product_name))[:120]
-        out_path = os.path.join(OUT_PRODUCT_DIR, f"{safe_name}.pkl").replace("\\", "/")
-
-        joblib.dump({"model": m, "feature_cols": product_feature_cols, "product_name": product_name}, out_path)
-        product_paths[product_name] = out_path
-
-        summary.append({"商品名": product_name, "rows": len(g)})
-
-    joblib.dump(product_paths, OUT_PRODUCT_PATHS)
+        datasets[product_name] = (g[product_feature_cols], g[qty_col])
+
+    # 前回と同じ商品は学習しない／行が足されただけなら木を足す（それ以外をまとめてプールへ）
+    product_config = training_config_hash(product_feature_cols, args.mode)
+    t0 = time.perf_counter()
+    built = {}
+    to_train = {}
+    for product_name, (X_p, y_p) in datasets.items():
+        old = prev_products.get(product_name)
+        plan, meta = plan_training(old, product_config, X_p, y_p, args.warm_start)
+        if plan == "train":
+            to_train[product_name] = meta
+            continue
+        t1 = time.perf_counter()
+        built[product_name] = _build(old, plan, meta, X_p, y_p) + (time.perf_counter() - t1,)
+    trained = train_products({name: datasets[name] for name in to_train}, workers=args.workers,
+                             nthread=args.nthread, split=args.split, mode=args.mode)
+    wall = time.perf_counter() - t0
+
+    for product_name, (X_p, y_p) in datasets.items():
+        if product_name in built:
+            entry, m, sec = built[product_name]
+        else:
+            m, sec = trained[product_name]
+            entry, _ = _build(None, "train", to_train[product_name], X_p, y_p, lambda: m)
+        entry.update({
+            "name": product_name,
+            "key": normalize_product_name(product_name),
+            "feature_cols": product_feature_cols,
+        })
+        product_entries.append(entry)
+
+        if WRITE_LEGACY_PICKLES:
+            if m is None:
+                m = regressor_from_bytes(entry["raw"])
+            safe_name = "".join(ch if ch.isalnum() else "_" for ch in str(product_name))[:120]
+            out_path = os.path.join(OUT_PRODUCT_DIR, f"{safe_name}.pkl").replace("\\", "/")
+            joblib.dump({"model": m, "feature_cols": product_feature_cols, "product_name": product_name}, out_path)
+            product_paths[product_name] = out_path
+
+        summary.append({"商品名": product_name, "rows": len(X_p), "sec": sec, "trees": entry.get("trees", 0)})
+
+    # ---------- 3) 共通モデル（任意） ----------
+    global_entry = None
+    if args.global_model:
+        t1 = time.perf_counter()
+        X_g, y_g, product_categories = make_global_table(df2, product_feature_cols, qty_col)
+        global_params = GLOBAL_XGB_PARAMS
+        global_config = training_config_hash(list(X_g.columns), args.mode, params=global_params)
+        categories = {c: list(X_g[c].cat.categories) for c in (GLOBAL_PRODUCT_COL, GLOBAL_CATEGORY_COL)}
+        prev_global = prev.manifest.get("global") if prev is not None else None
+        # 前回の木はカテゴリの番号で分岐しているので、商品・カテゴリーの一覧が変わったら木を足さずに学習し直す
+        global_warm = args.warm_start and prev_global is not None and prev_global.get("categories") == categories
+        global_entry, _ = _build(
+            prev_global, *plan_training(prev_global, global_config, X_g, y_g, global_warm), X_g, y_g,
+            lambda: train_xgb_regressor_time_series(X_g, y_g, n_splits=N_SPLITS, n_jobs=args.nthread,
+                                                    mode=args.mode, params=global_params),
+            params=global_params,
+        )
+        global_entry.update({
+            "name": "共通商品モデル",
+            "feature_cols": list(X_g.columns),
+            "categories": categories,
+            "product_categories": product_categories,
+        })
+        global_sec = time.perf_counter() - t1
+
+    # 引き継ぐブースターはバイト列にコピー済みなので、書き込み前に前回のパックを閉じる
+    if prev is not None:
+        prev.close()
+    manifest = write_model_pack(OUT_MODEL_PACK, sales_entry, product_entries, extra={"qty_target_col": qty_col},
+                                global_entry=global_entry)
+    if WRITE_LEGACY_PICKLES:
+        joblib.dump(product_paths, OUT_PRODUCT_PATHS)
+    catalog = write_menu_catalog(OUT_MENU_CATALOG, build_menu_catalog_from_csv(CSV_PATH))
 
     # 学習サマリを出力（確認用）
     info = {
-        "sales_model": OUT_SALES_MODEL,
-        "product_models": len(product_paths),
-        "product_dir": OUT_PRODUCT_DIR,
+        "model_pack": OUT_MODEL_PACK,
+        "pack_version": manifest["pack_version"],
+        "product_models": len(product_entries),
+        "menu_catalog": OUT_MENU_CATALOG,
+        "menu_items": len(catalog["items"]),
+        "legacy_pickles": WRITE_LEGACY_PICKLES,
         "qty_target_col": qty_col,
         "daily_rows": len(daily),
+        "workers": args.workers,
+        "nthread": args.nthread,
+        "split": args.split,
+        "mode": args.mode,
+        "trained": plans["train"],
+        "warm_started": plans["warm"],
+        "skipped": plans["skip"],
+        "product_train_wall_sec": round(wall, 1),
+        "product_train_cpu_sec": round(sum(s["sec"] for s in summary), 1),
+        "product_trees_median": int(np.median([s["trees"] for s in summary])) if summary else 0,
     }
+    if global_entry is not None:
+        info.update({
+            "global_model_products": len(global_entry["product_categories"]),
+            "global_model_rows": global_entry["rows"],
+            "global_model_trees": global_entry.get("trees", 0),
+            "global_model_sec": round(global_sec, 1),
+        })
     print(json.dumps(info, ensure_ascii=False, indent=2))
 
     # 代表で数件だけ表示
-    summary = sorted(summary, key=lambda x: -x["rows"])[:10]
     print("top products by rows:")
-    for s in summary:
+    for s in sorted(summary, key=lambda x: -x["rows"])[:10]:
         print(f"- {s['商品名']} ({s['rows']})")
+    print("slowest products:")
+    for s in sorted(summary, key=lambda x: -x["sec"])[:10]:
+        print(f"- {s['商品名']} {s['sec']:.1f}s ({s['rows']} rows, {s['trees']} trees)")
 
 
 if __name__ == "__main__":
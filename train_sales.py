@@ -7,6 +7,9 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score
 import numpy as np
 
+from calendar_features import add_calendar_columns
+from history_store import load_history
+
 DATA_PATH = "商品別売上_統合_統合済v1.13.csv"
 
 SALES_FEATURES = [
@@ -19,11 +22,14 @@ TARGET = "売上"
 
 def main():
     try:
-        df = pd.read_csv(DATA_PATH)
+        df = load_history(DATA_PATH)
     except Exception as e:
         print(f"[ERROR] CSVの読み込みに失敗しました: {e}")
         sys.exit(1)
 
+    # 曜日・祝日・季節・長期休みなどはカレンダー表から引き直す（アプリの予測時と同じ定義）
+    df = add_calendar_columns(df, "日付")
+
     missing = [c for c in SALES_FEATURES + [TARGET] if c not in df.columns]
     if missing:
         print("[ERROR] 学習に必要な列が見つかりません:", ", ".join(missing))
@@ -0,0 +1,89 @@
+# weather_history.py
+# 過去の天気・気温（日別）を日付オフセットで引ける配列にまとめる
+# ・WEATHER_HISTORY_PATTERN に合う CSV（列: date, temp_max, temp_min, weather）を全部読む
+#   同じ日付が複数ファイルにあればファイル名順で後のものを使う
+# ・ファイルが変わったときだけ読み直す（普段はプロセス内で使い回す）
+# ・引くのは配列の添字だけなので、何年分に増えても日付範囲の参照はベクトル演算1回
+
+import glob
+import threading
+
+import numpy as np
+import pandas as pd
+
+from file_utils import file_signature
+
+
+WEATHER_HISTORY_PATTERN = "*_天気気温.csv"
+
+
+class WeatherHistory:
+    """start からの日数を添字にした日別の天気配列（欠けている日は NaN / 空文字）"""
+
+    def __init__(self, df: pd.DataFrame):
+        dates = pd.to_datetime(df["date"], errors="coerce")
+        df = df.assign(date=dates).dropna(subset=["date"]).drop_duplicates("date", keep="last")
+        d = df["date"].to_numpy().astype("datetime64[D]")
+        if len(d) == 0:
+            self.start = np.datetime64("1970-01-01", "D")
+            n = 0
+        else:
+            self.start = d.min()
+            n = int((d.max() - self.start).astype(np.int64)) + 1
+        idx = (d - self.start).astype(np.int64)
+
+        self.temp_max = np.full(n, np.nan)
+        self.temp_min = np.full(n, np.nan)
+        self.weather = np.full(n, "", dtype=object)
+        self.found = np.zeros(n, dtype=bool)
+        self.temp_max[idx] = pd.to_numeric(df["temp_max"], errors="coerce").to_numpy(dtype=np.float64)
+        self.temp_min[idx] = pd.to_numeric(df["temp_min"], errors="coerce").to_numpy(dtype=np.float64)
+        self.weather[idx] = df["weather"].fillna("").to_numpy(dtype=object)
+        self.found[idx] = True
+
+    def __len__(self):
+        return int(self.found.sum())
+
+    def lookup(self, dates):
+        """
+        日付の並びをまとめて引く：(天気, 最高気温, 最低気温, 有無) の配列
+        範囲外・欠けている日は 有無=False
+        """
+        d = np.asarray(pd.to_datetime(pd.Series(list(dates))).to_numpy(), dtype="datetime64[D]")
+        if not len(self.found):
+            return (np.full(len(d), "", dtype=object), np.full(len(d), np.nan),
+                    np.full(len(d), np.nan), np.zeros(len(d), dtype=bool))
+        idx = (d - self.start).astype(np.int64)
+        found = (idx >= 0) & (idx < len(self.found))
+        safe = np.where(found, idx, 0)
+        found &= self.found[safe]
+        return (np.where(found, self.weather[safe], ""),
+                np.where(found, self.temp_max[safe], np.nan),
+                np.where(found, self.temp_min[safe], np.nan),
+                found)
+
+    def last_year(self, dates):
+        """各日付の前年同日（2/29 は 2/28）を引く"""
+        prev = pd.to_datetime(pd.Series(list(dates))) - pd.DateOffset(years=1)
+        return self.lookup(prev)
+
+
+_lock = threading.Lock()
+_cached = (None, None)   # (ファイルのシグネチャ, WeatherHistory)
+
+
+def load_weather_history(pattern: str = WEATHER_HISTORY_PATTERN) -> WeatherHistory:
+    """pattern に合う CSV をまとめた WeatherHistory（ファイルが変わっていなければ前回のもの）"""
+    global _cached
+    paths = sorted(glob.glob(pattern))
+    sig = tuple((p, file_signature(p)) for p in paths)
+    with _lock:
+        if _cached[0] == sig:
+            return _cached[1]
+    frames = [pd.read_csv(p) for p in paths]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["date", "temp_max", "temp_min", "weather"])
+    history = WeatherHistory(df)
+    with _lock:
+        _cached = (sig, history)
+    return history
@@ -0,0 +1,72 @@
+# weather_store.py
+# OpenWeatherMap の 5日間/3時間予報を都市ごとに1回だけ取得し、日別の表にまとめる
+# ・取得結果は WEATHER_TTL_SEC の間プロセス内で使い回す（再実行・日付ごとに API を叩かない）
+# ・日別の値：最高気温は3時間枠の最大、最低気温は最小、天気は最も多く出た枠の天気
+# ・取得に失敗したら前回の表（期限切れでも）を返す。無ければ空の表
+
+import time
+import datetime
+import threading
+from collections import Counter, defaultdict
+
+from resilience import resilient_get
+
+
+FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+WEATHER_TTL_SEC = 30 * 60
+
+_lock = threading.Lock()
+_tables = {}   # (都市, API キー) -> (取得時刻, 日付 -> (天気, 最高, 最低))
+
+
+def aggregate_forecast(items) -> dict:
+    """3時間枠のリスト（API の list）を 日付 -> (天気, 最高気温, 最低気温) にまとめる"""
+    slots = defaultdict(list)
+    for item in items:
+        d = datetime.datetime.fromtimestamp(item["dt"]).date()
+        slots[d].append(item)
+
+    table = {}
+    for d, day_items in slots.items():
+        # 同数なら早い時刻の枠の天気を優先（Counter は出現順を保つ）
+        weather = Counter(it["weather"][0]["main"] for it in day_items).most_common(1)[0][0]
+        temp_max = max(it["main"]["temp_max"] for it in day_items)
+        temp_min = min(it["main"]["temp_min"] for it in day_items)
+        table[d] = (weather, temp_max, temp_min)
+    return table
+
+
+def _download(city: str, api_key: str, budget=None):
+    url = f"{FORECAST_URL}?q={city}&appid={api_key}&units=metric&lang=ja"
+    r = resilient_get(url, timeout=10, budget=budget)
+    # 401（キー誤り）・404（都市名誤り）などは失敗扱い。空の表としてキャッシュしない
+    if r is None or not r.ok:
+        return None
+    try:
+        payload = r.json()
+        if "list" not in payload:
+            return None
+        return aggregate_forecast(payload["list"])
+    except Exception:
+        return None
+
+
+def forecast_table(city: str, api_key: str, budget=None) -> dict:
+    """city の日別予報（TTL 内はキャッシュ、切れていたら1回だけ取り直す）"""
+    key = (city, api_key)
+    with _lock:
+        hit = _tables.get(key)
+    if hit is not None and time.time() - hit[0] < WEATHER_TTL_SEC:
+        return hit[1]
+
+    table = _download(city, api_key, budget)
+    if table is None:
+        return hit[1] if hit is not None else {}
+    with _lock:
+        _tables[key] = (time.time(), table)
+    return table
+
+
+def forecast_for(date: datetime.date, city: str, api_key: str, budget=None):
+    """date の (天気, 最高気温, 最低気温)。予報が無ければ (None, None, None)"""
+    return forecast_table(city, api_key, budget).get(date, (None, None, None))